@@ -0,0 +1,200 @@
+# chat/audio.py
+
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+BYTES_PER_SAMPLE = 2  # PCM s16le mono
+OUTPUT_MIME_TYPE = "audio/ogg"
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "workers": 2,
+    "max_seconds": 120,        # durée utile maximale après découpe des silences
+    "max_input_seconds": 600,  # au-delà, la note est refusée sans être analysée
+    "too_long": "truncate",    # "truncate" ou "reject"
+    "silence_db": -40,         # seuil d'énergie (dBFS) d'une trame considérée silencieuse
+    "padding_ms": 200,         # marge conservée autour de la parole
+    "bitrate": "24k",
+    "timeout": 30,             # secondes par note
+    "ffmpeg": "ffmpeg",
+}
+
+
+class AudioRejected(ValueError):
+    """Note vocale refusée (trop longue, silencieuse) : message destiné à l'utilisateur"""
+
+
+def find_speech(pcm, silence_db, padding_ms):
+    """
+    Bornes (en échantillons) de la parole dans un PCM 16 bits mono, par énergie
+    moyenne de trames de FRAME_MS. Seuls les silences de début et de fin sont
+    retirés : on parcourt depuis chaque extrémité jusqu'à la première trame
+    au-dessus du seuil. Renvoie None si toute la note est silencieuse.
+    """
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    threshold = frame * (32768 * 10 ** (silence_db / 20)) ** 2  # somme des carrés d'une trame
+    frames = (len(pcm) + frame - 1) // frame
+
+    def voiced(index):
+        return sum(s * s for s in pcm[index * frame:(index + 1) * frame]) > threshold
+
+    first = next((i for i in range(frames) if voiced(i)), None)
+    if first is None:
+        return None
+    last = next(i for i in range(frames - 1, first - 1, -1) if voiced(i))
+
+    padding = SAMPLE_RATE * padding_ms // 1000
+    return max(first * frame - padding, 0), min((last + 1) * frame + padding, len(pcm))
+
+
+def _run_ffmpeg(args, data, timeout):
+    result = subprocess.run(args, input=data, capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip()[-300:] or "ffmpeg a échoué")
+    return result.stdout
+
+
+def preprocess(data, options):
+    """
+    Exécuté dans un processus du pool : décode (ffmpeg), mono 16 kHz, découpe
+    les silences de début et de fin, limite la durée puis réencode en Opus.
+    Renvoie (octets, rapport).
+    """
+    start = time.perf_counter()
+    ffmpeg, timeout = options["ffmpeg"], options["timeout"]
+
+    # Fichier temporaire : les conteneurs m4a/mp4 ne se décodent pas depuis un pipe
+    with tempfile.NamedTemporaryFile(suffix=".audio") as source:
+        source.write(data)
+        source.flush()
+        raw = _run_ffmpeg([
+            ffmpeg, "-nostdin", "-v", "error", "-i", source.name,
+            "-t", str(options["max_input_seconds"] + 1),
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1",
+        ], None, timeout)
+
+    pcm = array("h")
+    pcm.frombytes(raw[:len(raw) - len(raw) % BYTES_PER_SAMPLE])
+    if sys.byteorder == "big":
+        pcm.byteswap()
+    original_seconds = len(pcm) / SAMPLE_RATE
+    if original_seconds > options["max_input_seconds"]:
+        raise AudioRejected(f"Note vocale trop longue (plus de {options['max_input_seconds'] // 60} min).")
+
+    bounds = find_speech(pcm, options["silence_db"], options["padding_ms"])
+    if bounds is None:
+        raise AudioRejected("La note vocale ne contient que du silence. Réessaie en parlant plus près du micro.")
+    pcm = pcm[bounds[0]:bounds[1]]
+
+    truncated = False
+    max_samples = options["max_seconds"] * SAMPLE_RATE
+    if len(pcm) > max_samples:
+        if options["too_long"] == "reject":
+            raise AudioRejected(f"Note vocale trop longue : {options['max_seconds']} secondes maximum.")
+        pcm = pcm[:max_samples]
+        truncated = True
+
+    if sys.byteorder == "big":
+        pcm.byteswap()
+    encoded = _run_ffmpeg([
+        ffmpeg, "-nostdin", "-v", "error",
+        "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+        "-c:a", "libopus", "-b:a", options["bitrate"], "-application", "voip", "-f", "ogg", "pipe:1",
+    ], pcm.tobytes(), timeout)
+
+    seconds = len(pcm) / SAMPLE_RATE
+    return encoded, {
+        "original_bytes": len(data),
+        "bytes": len(encoded),
+        "bytes_saved": len(data) - len(encoded),
+        "original_seconds": round(original_seconds, 2),
+        "seconds": round(seconds, 2),
+        "seconds_saved": round(original_seconds - seconds, 2),
+        "truncated": truncated,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000),
+    }
+
+
+class AudioPreprocessor:
+    """
+    Prétraitement des notes vocales avant envoi à Gemini, dans un pool de
+    processus (décodage et analyse hors des threads de requête).
+
+    Moins d'octets à téléverser et moins de jetons audio (facturés à la durée).
+    Sans ffmpeg, ou en cas d'échec de décodage, l'audio d'origine est transmis
+    tel quel. Réglages : settings.AUDIO_PREPROCESSING.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._lock = threading.Lock()
+        self._available = None
+
+    @property
+    def options(self):
+        return {**DEFAULT_OPTIONS, **getattr(settings, "AUDIO_PREPROCESSING", {})}
+
+    def available(self, options):
+        if self._available is None:
+            self._available = bool(options["enabled"]) and shutil.which(options["ffmpeg"]) is not None
+            if options["enabled"] and not self._available:
+                logger.warning("ffmpeg introuvable : notes vocales transmises sans prétraitement")
+        return self._available
+
+    def process(self, data, mime_type):
+        """Renvoie (partie de contenu Gemini, rapport ou None). Lève AudioRejected."""
+        options = self.options
+        original = {"mime_type": mime_type, "data": data}
+        if not data or not self.available(options):
+            return original, None
+
+        try:
+            encoded, report = self._get_pool(options).submit(preprocess, data, options).result(
+                timeout=options["timeout"] * 2
+            )
+        except AudioRejected:
+            raise
+        except BrokenProcessPool:
+            self._reset_pool()
+            logger.warning("Pool audio interrompu : note vocale transmise sans prétraitement")
+            return original, None
+        except Exception as e:
+            logger.warning(f"Prétraitement audio impossible, note transmise telle quelle : {e}")
+            return original, None
+
+        logger.info(f"Note vocale prétraitée : {json.dumps(report)}")
+        return {"mime_type": OUTPUT_MIME_TYPE, "data": encoded}, report
+
+    def _get_pool(self, options):
+        with self._lock:
+            if self._pool is None:
+                # spawn : pas de fork d'un processus serveur multi-thread
+                self._pool = ProcessPoolExecutor(
+                    max_workers=options["workers"], mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+AUDIO = AudioPreprocessor()
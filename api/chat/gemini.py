@@ -0,0 +1,84 @@
+# chat/gemini.py
+
+import os
+import time
+import logging
+import threading
+import importlib
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.5-flash-lite"  # Plus stable pour les quotas
+
+# Chargement paresseux : le SDK Gemini (~1 s d'import) n'est chargé qu'au premier
+# appel, pas au démarrage de chaque worker ni à chaque commande manage.py.
+_lock = threading.Lock()
+_genai = None
+_models = {}
+
+# Durées (secondes) des chargements paresseux, pour le rapport de démarrage
+LOAD_TIMINGS = {}
+
+
+def lazy_import(module_name):
+    """Importe un module en mesurant la durée du premier import"""
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    LOAD_TIMINGS.setdefault(module_name, round(time.perf_counter() - start, 4))
+    return module
+
+
+def get_genai():
+    """Renvoie le module google.generativeai, configuré une seule fois par processus"""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                genai = lazy_import("google.generativeai")
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _genai = genai
+    return _genai
+
+
+def errors():
+    """
+    Module google.api_core.exceptions, chargé à la demande.
+
+    Utilisable directement dans une clause except (évaluée seulement si une
+    exception est levée) : ``except errors().ResourceExhausted:``
+    """
+    return lazy_import("google.api_core.exceptions")
+
+
+def get_model(system_instruction=None, **kwargs):
+    """
+    GenerativeModel partagé par processus (un par configuration).
+    Le modèle est sans état : chaque session crée son ChatSession via start_chat().
+    """
+    key = (system_instruction, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    model = _models.get(key)
+    if model is None:
+        genai = get_genai()
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                start = time.perf_counter()
+                model = genai.GenerativeModel(MODEL_NAME, system_instruction=system_instruction, **kwargs)
+                LOAD_TIMINGS.setdefault("GenerativeModel", round(time.perf_counter() - start, 4))
+                _models[key] = model
+    return model
+
+
+def prewarm(system_instruction=None):
+    """Charge le SDK et construit le modèle partagé en arrière-plan"""
+    def _warm():
+        try:
+            start = time.perf_counter()
+            get_model(system_instruction)
+            logger.info(f"Modèle Gemini préchauffé en {time.perf_counter() - start:.2f} s")
+        except Exception as e:
+            logger.error(f"Préchauffage Gemini impossible : {e}")
+
+    thread = threading.Thread(target=_warm, name="gemini-prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,125 @@
+# chat/idempotency.py
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+HEADER = "Idempotency-Key"
+
+
+class IdempotencyConflict(Exception):
+    """Clé déjà utilisée pour une requête différente (autre session ou autre contenu)"""
+
+    def __init__(self):
+        super().__init__("Cette clé d'idempotence a déjà servi pour une autre requête.")
+
+
+def idempotency_key(request, scope):
+    """Clé d'idempotence fournie par le client (en-tête Idempotency-Key), préfixée par l'endpoint"""
+    key = request.headers.get(HEADER, "").strip()
+    if not key or len(key) > 255:
+        return None
+    return f"{scope}:{key}"
+
+
+def request_fingerprint(request):
+    """
+    Empreinte du contenu de la requête (session_id compris) : champs de
+    formulaire et fichiers en multipart, corps brut sinon. Lue comme
+    build_content_and_chat la lira ensuite (fichiers rembobinés).
+    """
+    digest = hashlib.sha256()
+    if request.content_type and "multipart/form-data" in request.content_type:
+        for name, values in sorted(request.POST.lists()):
+            digest.update(json.dumps([name, values]).encode())
+        for name, upload in sorted(request.FILES.items()):
+            digest.update(name.encode())
+            for chunk in upload.chunks():
+                digest.update(chunk)
+            upload.seek(0)
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+class _Entry:
+    __slots__ = ("event", "result", "expires_at", "fingerprint")
+
+    def __init__(self, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.event = threading.Event()
+        self.result = None
+        self.expires_at = None  # None tant que la requête est en cours
+
+    def wait(self, timeout):
+        """Attend le résultat de la requête d'origine ; None si le délai expire"""
+        self.event.wait(timeout)
+        return self.result
+
+
+class IdempotencyStore:
+    """
+    Résultats des requêtes chat indexés par clé d'idempotence.
+
+    Un doublon qui arrive pendant la requête d'origine s'attache à son résultat ;
+    un doublon ultérieur reçoit le résultat conservé pendant TTL secondes.
+    Les échecs ne sont pas conservés : le client peut réessayer avec la même clé.
+    Chaque entrée porte l'empreinte de la requête d'origine : la même clé avec
+    un autre contenu lève IdempotencyConflict (422) au lieu de rejouer une
+    réponse étrangère.
+    """
+
+    TTL = 600           # secondes
+    MAX_ENTRIES = 2048
+    WAIT_TIMEOUT = 60   # attente max d'un doublon en vol
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint=None):
+        """
+        Renvoie (entrée, propriétaire) ; propriétaire=True si la requête doit être exécutée.
+        Lève IdempotencyConflict si la clé est associée à une autre empreinte.
+        """
+        with self._lock:
+            self._purge()
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    raise IdempotencyConflict()
+                return entry, False
+            entry = _Entry(fingerprint)
+            self._entries[key] = entry
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+            return entry, True
+
+    def complete(self, key, entry, result, keep=True):
+        """Publie le résultat aux doublons en attente, et le conserve si keep=True"""
+        entry.result = result
+        entry.expires_at = time.monotonic() + self.TTL
+        with self._lock:
+            if not keep and self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.event.set()
+
+    def forget(self, key, entry):
+        """Oublie un résultat conservé devenu un échec (flux dont la génération a échoué)"""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry.expires_at is not None and entry.expires_at < now
+        ]
+        for key in expired:
+            del self._entries[key]
+
+
+IDEMPOTENCY = IdempotencyStore()
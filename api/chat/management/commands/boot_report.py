@@ -0,0 +1,88 @@
+# chat/management/commands/boot_report.py
+
+import os
+import sys
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Ce que charge un worker au démarrage (sans le SDK Gemini, chargé à la demande)
+BOOT_SNIPPET = """
+import time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print("BOOT_SECONDS", time.perf_counter() - start)
+"""
+
+# Chargements paresseux mesurés à part : coût du premier appel chat
+LAZY_MODULES = ["google.generativeai", "google.api_core.exceptions", "PIL.Image"]
+
+
+class Command(BaseCommand):
+    help = "Mesure le temps d'import et de démarrage d'un worker (détection des régressions de cold start)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=15, help="Nombre de modules les plus coûteux à afficher")
+        parser.add_argument("--budget", type=float, help="Échec si le démarrage dépasse ce nombre de secondes")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (pour la CI)")
+
+    def handle(self, *args, **options):
+        boot_seconds, imports = self._measure(BOOT_SNIPPET)
+        lazy = {name: self._measure(f"import {name}")[1].get(name, 0.0) for name in LAZY_MODULES}
+
+        top = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:options["top"]]
+        report = {
+            "boot_seconds": round(boot_seconds, 4),
+            "top_imports": [{"module": name, "seconds": round(sec, 4)} for name, sec in top],
+            "lazy_imports": {name: round(sec, 4) for name, sec in lazy.items()},
+            "gemini_loaded_at_boot": "google.generativeai" in imports,
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"Démarrage worker : {report['boot_seconds']:.3f} s")
+            self.stdout.write(f"SDK Gemini chargé au démarrage : {report['gemini_loaded_at_boot']}")
+            self.stdout.write("Imports les plus coûteux (cumulés) :")
+            for item in report["top_imports"]:
+                self.stdout.write(f"  {item['seconds']:8.3f} s  {item['module']}")
+            self.stdout.write("Chargements paresseux (premier appel) :")
+            for name, sec in report["lazy_imports"].items():
+                self.stdout.write(f"  {sec:8.3f} s  {name}")
+
+        if options["budget"] is not None and boot_seconds > options["budget"]:
+            raise CommandError(f"Démarrage trop lent : {boot_seconds:.3f} s > {options['budget']} s")
+
+    def _measure(self, snippet):
+        """Exécute le code dans un interpréteur neuf avec -X importtime"""
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", snippet],
+            capture_output=True, text=True, env=self._env(),
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else "Échec de la mesure")
+
+        boot_seconds = 0.0
+        for line in result.stdout.splitlines():
+            if line.startswith("BOOT_SECONDS"):
+                boot_seconds = float(line.split()[1])
+
+        # Format : "import time: self [us] | cumulative | imported package"
+        imports = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            imports.setdefault(name.strip(), int(cumulative) / 1_000_000)
+        return boot_seconds, imports
+
+    def _env(self):
+        from django.conf import settings
+
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE)
+        return env
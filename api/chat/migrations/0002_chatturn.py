@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('session_id', models.CharField(db_index=True, max_length=100)),
+                ('endpoint', models.CharField(choices=[('chat', 'Réponse complète'), ('stream', 'Streaming SSE')], max_length=10)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('latency_ms', models.PositiveIntegerField()),
+                ('first_token_ms', models.PositiveIntegerField(null=True)),
+                ('prompt_tokens', models.PositiveIntegerField(null=True)),
+                ('response_tokens', models.PositiveIntegerField(null=True)),
+                ('text_chars', models.PositiveIntegerField(default=0)),
+                ('image_count', models.PositiveSmallIntegerField(default=0)),
+                ('audio_bytes', models.PositiveIntegerField(default=0)),
+                ('request_bytes', models.PositiveIntegerField(default=0)),
+                ('reused_diagnosis', models.BooleanField(default=False)),
+                ('error', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['endpoint', 'created_at'], name='chat_chattu_endpoin_0d1f7b_idx'), models.Index(fields=['status', 'created_at'], name='chat_chattu_status_e39aa9_idx')],
+            },
+        ),
+    ]
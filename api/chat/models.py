@@ -1,3 +1,47 @@
 from django.db import models
 
-# Create your models here.
+
+class PhotoDiagnosis(models.Model):
+    """Diagnostic Gemini associé à l'empreinte perceptuelle d'une photo (voir chat/photo_index.py)"""
+
+    phash = models.BigIntegerField()           # dHash 64 bits, stocké signé
+    intent = models.CharField(max_length=40)   # sha1 du texte normalisé
+    diagnosis = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @classmethod
+    def prune(cls, keep):
+        """Ne conserve que les `keep` diagnostics les plus récents"""
+        cutoff = cls.objects.order_by("-created_at").values_list("created_at", flat=True)[keep:keep + 1]
+        if cutoff:
+            cls.objects.filter(created_at__lte=cutoff[0]).delete()
+
+
+class ChatTurn(models.Model):
+    """
+    Un échange chat (requête + réponse Gemini), écrit en différé par
+    chat/turn_log.py : suivi de la capacité et du quota.
+    """
+
+    ENDPOINT_CHOICES = [("chat", "Réponse complète"), ("stream", "Streaming SSE")]
+
+    created_at = models.DateTimeField(db_index=True)
+    session_id = models.CharField(max_length=100, db_index=True)
+    endpoint = models.CharField(max_length=10, choices=ENDPOINT_CHOICES)
+    status = models.PositiveSmallIntegerField()
+    latency_ms = models.PositiveIntegerField()
+    first_token_ms = models.PositiveIntegerField(null=True)   # streaming uniquement
+    prompt_tokens = models.PositiveIntegerField(null=True)
+    response_tokens = models.PositiveIntegerField(null=True)
+    text_chars = models.PositiveIntegerField(default=0)
+    image_count = models.PositiveSmallIntegerField(default=0)
+    audio_bytes = models.PositiveIntegerField(default=0)     # après prétraitement
+    request_bytes = models.PositiveIntegerField(default=0)   # corps HTTP reçu
+    reused_diagnosis = models.BooleanField(default=False)
+    error = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["endpoint", "created_at"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
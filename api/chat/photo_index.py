@@ -0,0 +1,202 @@
+# chat/photo_index.py
+
+import re
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def dhash(img, size=8):
+    """
+    Empreinte perceptuelle (difference hash, 64 bits) d'une image PIL.
+    Deux photos quasi identiques (recadrage léger, recompression...) ont des
+    empreintes à faible distance de Hamming.
+    """
+    gray = img.convert("L").resize((size + 1, size))
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def normalize_intent(text):
+    """Clé d'intention : texte sans accents, ponctuation ni casse (vide = photo seule)"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = " ".join(re.findall(r"\w+", text))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class PhotoFingerprint:
+    __slots__ = ("hash", "intent")
+
+    def __init__(self, img, user_text):
+        self.hash = dhash(img)
+        self.intent = normalize_intent(user_text)
+
+
+class BKTree:
+    """Arbre BK sur la distance de Hamming : recherche des empreintes à distance <= r"""
+
+    def __init__(self):
+        self.root = None  # [hash, {distance: enfant}]
+        self.size = 0
+
+    def add(self, value):
+        if self.root is None:
+            self.root = [value, {}]
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [value, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Renvoie [(distance, hash)] triés par distance"""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                results.append((distance, node[0]))
+            for d, child in node[1].items():
+                if distance - radius <= d <= distance + radius:
+                    stack.append(child)
+        results.sort()
+        return results
+
+
+class PhotoIndex:
+    """
+    Index des diagnostics récents par empreinte de photo.
+
+    - même intention et distance <= REUSE_DISTANCE : le diagnostic est réutilisé
+      tel quel (aucun appel Gemini) ;
+    - distance <= CONTEXT_DISTANCE : le diagnostic précédent est joint comme contexte.
+
+    Mémoire bornée (MAX_ENTRIES, les plus anciennes sont oubliées) et persistance
+    dans la table chat_photodiagnosis, rechargée au premier usage après redémarrage.
+    Seuls les premiers échanges d'une session sont indexés et réutilisés (chat/views.py).
+    """
+
+    REUSE_DISTANCE = 4
+    CONTEXT_DISTANCE = 10
+    MAX_AGE = 7 * 24 * 3600   # secondes
+    MAX_ENTRIES = 5000
+
+    def __init__(self):
+        self._entries = OrderedDict()  # (hash, intent) -> (diagnostic, created_at)
+        self._intents = {}             # hash -> intentions indexées
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def lookup(self, photo):
+        """Renvoie (diagnostic, réutilisable) ou (None, False)"""
+        self._ensure_loaded()
+        now = time.time()
+        with self._lock:
+            context = None
+            for distance, value in self._tree.search(photo.hash, self.CONTEXT_DISTANCE):
+                entries = [
+                    (intent, self._entries[(value, intent)]) for intent in self._intents.get(value, ())
+                ]
+                entries = [(intent, entry) for intent, entry in entries if now - entry[1] < self.MAX_AGE]
+                for intent, (diagnosis, _) in entries:
+                    if intent == photo.intent and distance <= self.REUSE_DISTANCE:
+                        self._entries.move_to_end((value, intent))
+                        return diagnosis, True
+                if context is None and entries:
+                    context = max(entries, key=lambda item: item[1][1])[1][0]
+            return context, False
+
+    def add(self, photo, diagnosis):
+        self._ensure_loaded()
+        with self._lock:
+            self._insert(photo.hash, photo.intent, diagnosis, time.time())
+        try:
+            from .models import PhotoDiagnosis
+
+            PhotoDiagnosis.objects.create(
+                phash=_to_signed(photo.hash), intent=photo.intent, diagnosis=diagnosis
+            )
+            if len(self._entries) >= self.MAX_ENTRIES:
+                PhotoDiagnosis.prune(self.MAX_ENTRIES)
+        except Exception as e:
+            logger.error(f"Persistance de l'empreinte photo impossible : {e}")
+
+    def _insert(self, value, intent, diagnosis, created_at):
+        key = (value, intent)
+        self._intents.setdefault(value, set()).add(intent)
+        self._entries[key] = (diagnosis, created_at)
+        self._entries.move_to_end(key)
+        self._tree.add(value)
+
+        while len(self._entries) > self.MAX_ENTRIES:
+            (old_value, old_intent), _ = self._entries.popitem(last=False)
+            intents = self._intents[old_value]
+            intents.discard(old_intent)
+            if not intents:
+                del self._intents[old_value]
+
+        # L'arbre BK ne supporte pas la suppression : reconstruction quand il est trop périmé
+        if self._tree.size > 2 * len(self._intents) + 64:
+            self._tree = BKTree()
+            for h in self._intents:
+                self._tree.add(h)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                from .models import PhotoDiagnosis
+
+                since = timezone.now() - timedelta(seconds=self.MAX_AGE)
+                rows = PhotoDiagnosis.objects.filter(created_at__gte=since).order_by("-created_at")[:self.MAX_ENTRIES]
+                for row in reversed(list(rows)):
+                    self._insert(_to_unsigned(row.phash), row.intent, row.diagnosis, row.created_at.timestamp())
+                logger.info(f"Index photo rechargé : {len(self._entries)} empreinte(s)")
+            except Exception as e:
+                logger.error(f"Chargement de l'index photo impossible : {e}")
+
+
+def _to_signed(value):
+    """Empreinte 64 bits non signée -> entier signé (BigIntegerField)"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+PHOTO_INDEX = PhotoIndex()
@@ -0,0 +1,200 @@
+# chat/sse.py
+
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(data, event_id=None, event=None):
+    """Sérialise un événement SSE (champs id et event optionnels)"""
+    payload = data if isinstance(data, str) else json.dumps(data)
+    frame = f"id: {event_id}\n" if event_id else ""
+    if event:
+        frame += f"event: {event}\n"
+    return f"{frame}data: {payload}\n\n"
+
+
+def format_comment(text="keep-alive"):
+    """Commentaire SSE : ignoré par les clients mais garde la connexion ouverte"""
+    return f": {text}\n\n"
+
+
+def parse_last_event_id(value):
+    """Découpe un Last-Event-ID "<stream_id>:<seq>" ; renvoie (None, None) si invalide"""
+    if not value or ":" not in value:
+        return None, None
+    stream_id, _, seq = value.rpartition(":")
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None, None
+
+
+class StreamBuffer:
+    """
+    Réponse en cours de génération, conservée côté serveur.
+
+    Le producteur (thread Gemini) écrit des morceaux de texte ; ceux qui arrivent
+    dans la même fenêtre de FLUSH_WINDOW secondes sont fusionnés en un seul
+    événement. Chaque événement reçoit un numéro de séquence, ce qui permet à
+    un client reconnecté de reprendre après le dernier événement reçu.
+    Les rappels enregistrés par add_done_callback sont appelés à la fin de la
+    génération (contrôle d'admission), que le client lise encore ou non.
+    """
+
+    FLUSH_WINDOW = 0.05     # secondes
+    FLUSH_MAX_CHARS = 512   # flush immédiat au-delà
+
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.events = []
+        self.done = False
+        self.status = 200           # statut de la génération (429, 500, 503 en cas d'échec)
+        self.first_write_at = None  # premier morceau de texte (délai avant premier jeton)
+        self.updated_at = time.monotonic()
+        self._pending = []
+        self._pending_chars = 0
+        self._pending_since = None
+        self._cond = threading.Condition()
+        self._callbacks = []
+
+    def event_id(self, seq):
+        return f"{self.stream_id}:{seq}"
+
+    def write(self, text):
+        """Ajoute un morceau de texte au tampon de coalescence"""
+        with self._cond:
+            if self.first_write_at is None:
+                self.first_write_at = time.monotonic()
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append(text)
+            self._pending_chars += len(text)
+            if self._pending_chars >= self.FLUSH_MAX_CHARS or self._flush_due():
+                self._flush()
+
+    def push(self, data):
+        """Ajoute un événement complet (erreur, fin...) après le texte en attente"""
+        with self._cond:
+            self._flush()
+            self._append(data)
+
+    def finish(self, data="[DONE]"):
+        with self._cond:
+            self._flush()
+            if data is not None:
+                self._append(data)
+            self.done = True
+            self._cond.notify_all()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def add_done_callback(self, callback):
+        """Appelle callback(tampon) à la fin de la génération (tout de suite si déjà finie)"""
+        with self._cond:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            logger.error(f"Rappel de fin du flux {self.stream_id} en échec : {e}")
+
+    def wait_events(self, after_seq, timeout):
+        """
+        Attend des événements de séquence > after_seq.
+        Renvoie (événements, terminé) ; liste vide si le délai expire.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._pending and self._flush_due():
+                    self._flush()
+                if len(self.events) > after_seq + 1 or self.done:
+                    events = [(seq, self.events[seq]) for seq in range(after_seq + 1, len(self.events))]
+                    return events, self.done
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], False
+                # Réveil au plus tard à l'échéance de la fenêtre de flush
+                if self._pending:
+                    remaining = min(remaining, max(self.FLUSH_WINDOW / 2, 0.005))
+                self._cond.wait(remaining)
+
+    def _flush_due(self):
+        return time.monotonic() - self._pending_since >= self.FLUSH_WINDOW
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self._append({"text": "".join(self._pending)})
+        self._pending = []
+        self._pending_chars = 0
+        self._pending_since = None
+
+    def _append(self, data):
+        self.events.append(data)
+        self.updated_at = time.monotonic()
+        self._cond.notify_all()
+
+
+class StreamRegistry:
+    """Registre borné (nombre + durée de vie) des réponses en cours ou récentes"""
+
+    TTL = 600           # secondes après la dernière écriture (= IdempotencyStore.TTL)
+    MAX_STREAMS = 256
+
+    def __init__(self):
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self):
+        buffer = StreamBuffer(uuid.uuid4().hex)
+        with self._lock:
+            self._purge()
+            self._streams[buffer.stream_id] = buffer
+            while len(self._streams) > self.MAX_STREAMS:
+                _, evicted = self._streams.popitem(last=False)
+                logger.warning(f"Flux SSE {evicted.stream_id} évincé (registre plein)")
+        return buffer
+
+    def get(self, stream_id):
+        with self._lock:
+            self._purge()
+            return self._streams.get(stream_id)
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [
+            stream_id for stream_id, buffer in self._streams.items()
+            if buffer.done and now - buffer.updated_at > self.TTL
+        ]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+
+def stream_events(buffer, after_seq=-1, heartbeat_interval=15):
+    """Générateur SSE : rejoue le tampon après after_seq puis suit la génération"""
+    yield "retry: 3000\n\n"
+    while True:
+        events, done = buffer.wait_events(after_seq, heartbeat_interval)
+        if not events and not done:
+            yield format_comment()
+            continue
+        for seq, data in events:
+            yield format_event(data, buffer.event_id(seq))
+            after_seq = seq
+        if done:
+            return
+
+
+STREAMS = StreamRegistry()
@@ -1,3 +1,339 @@
-from django.test import TestCase
+import math
+import time
+import uuid
+import random
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from .audio import SAMPLE_RATE, find_speech
+from .sse import STREAMS, StreamBuffer, parse_last_event_id, stream_events
+from .idempotency import IdempotencyConflict, IdempotencyStore
+from .models import ChatTurn, PhotoDiagnosis
+from .photo_index import BKTree, PhotoFingerprint, PhotoIndex, _to_signed, _to_unsigned, hamming, normalize_intent
+from .turn_log import TurnLogWriter
+from .views import ChatStreamView, _generate, remember_reused
+
+
+class IdempotencyStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.store = IdempotencyStore()
+
+    def test_duplicate_gets_original_result(self):
+        entry, owner = self.store.begin("chat:k", "f1")
+        self.assertTrue(owner)
+        duplicate, duplicate_owner = self.store.begin("chat:k", "f1")
+        self.assertIs(duplicate, entry)
+        self.assertFalse(duplicate_owner)
+
+        threading.Timer(0.05, self.store.complete, args=("chat:k", entry, ({"response": "ok"}, 200))).start()
+        self.assertEqual(duplicate.wait(1), ({"response": "ok"}, 200))
+
+    def test_failure_is_not_kept(self):
+        entry, _ = self.store.begin("chat:k", "f1")
+        self.store.complete("chat:k", entry, ({"error": "x"}, 500), keep=False)
+        _, owner = self.store.begin("chat:k", "f1")
+        self.assertTrue(owner)
+
+    def test_forget_allows_retry(self):
+        entry, _ = self.store.begin("stream:k", "f1")
+        self.store.complete("stream:k", entry, "stream-id")
+        self.store.forget("stream:k", entry)
+        _, owner = self.store.begin("stream:k", "f1")
+        self.assertTrue(owner)
+
+    def test_same_key_different_request_conflicts(self):
+        self.store.begin("chat:k", "f1")
+        with self.assertRaises(IdempotencyConflict):
+            self.store.begin("chat:k", "f2")
+
+    def test_expired_entry_is_purged(self):
+        self.store.TTL = -1
+        entry, _ = self.store.begin("chat:k", "f1")
+        self.store.complete("chat:k", entry, ({"response": "ok"}, 200))
+        _, owner = self.store.begin("chat:k", "f2")
+        self.assertTrue(owner)
+
+    def test_entries_are_bounded(self):
+        self.store.MAX_ENTRIES = 3
+        for i in range(5):
+            self.store.begin(f"chat:{i}")
+        self.assertEqual(len(self.store._entries), 3)
+
+
+class BKTreeTests(SimpleTestCase):
+
+    def test_search_matches_brute_force(self):
+        rng = random.Random(42)
+        values = [rng.getrandbits(64) for _ in range(500)]
+        # quasi-doublons : quelques bits inversés
+        values += [value ^ (1 << rng.randrange(64)) for value in values[:50]]
+        tree = BKTree()
+        for value in values:
+            tree.add(value)
+
+        for query in values[:20] + [rng.getrandbits(64) for _ in range(5)]:
+            for radius in (0, 4, 10):
+                expected = sorted({(hamming(query, value), value) for value in values if hamming(query, value) <= radius})
+                self.assertEqual(tree.search(query, radius), expected)
+
+    def test_duplicates_are_stored_once(self):
+        tree = BKTree()
+        for _ in range(3):
+            tree.add(0xFF)
+        self.assertEqual(tree.size, 1)
+        self.assertEqual(tree.search(0xFE, 1), [(1, 0xFF)])
+
+    def test_empty_tree(self):
+        self.assertEqual(BKTree().search(123, 10), [])
+
+
+class StreamBufferTests(SimpleTestCase):
+
+    def test_chunks_within_window_are_coalesced(self):
+        buffer = StreamBuffer("s")
+        buffer.FLUSH_WINDOW = 10
+        for chunk in ["Bon", "jour", " !"]:
+            buffer.write(chunk)
+        buffer.finish()
+        self.assertEqual(buffer.events, [{"text": "Bonjour !"}, "[DONE]"])
+
+    def test_large_pending_text_is_flushed_immediately(self):
+        buffer = StreamBuffer("s")
+        buffer.FLUSH_WINDOW = 10
+        buffer.write("x" * buffer.FLUSH_MAX_CHARS)
+        self.assertEqual(len(buffer.events), 1)
+
+    def test_resume_after_last_event_id(self):
+        buffer = StreamBuffer("abc")
+        buffer.FLUSH_WINDOW = 0
+        for chunk in ["un", "deux", "trois"]:
+            buffer.write(chunk)
+        buffer.finish()
+
+        stream_id, seq = parse_last_event_id(buffer.event_id(0))
+        self.assertEqual((stream_id, seq), ("abc", 0))
+        frames = list(stream_events(buffer, seq))
+        self.assertEqual(frames[0], "retry: 3000\n\n")
+        self.assertEqual([frame.split("\n")[0] for frame in frames[1:]], ["id: abc:1", "id: abc:2", "id: abc:3"])
+        self.assertIn('"deux"', frames[1])
+        self.assertIn("[DONE]", frames[-1])
+
+    def test_wait_times_out_without_events(self):
+        events, done = StreamBuffer("s").wait_events(-1, 0.01)
+        self.assertEqual((events, done), ([], False))
+
+    def test_invalid_last_event_id(self):
+        for value in (None, "", "abc", "abc:x"):
+            self.assertEqual(parse_last_event_id(value), (None, None))
+
+
+def tone(seconds, amplitude=8000):
+    return [int(amplitude * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE)) for i in range(int(seconds * SAMPLE_RATE))]
+
+
+def silence(seconds, value=0):
+    return [value] * int(seconds * SAMPLE_RATE)
+
+
+class FindSpeechTests(SimpleTestCase):
+
+    def test_trims_leading_and_trailing_silence_with_padding(self):
+        pcm = silence(2) + tone(3) + silence(4, value=3)
+        self.assertEqual(find_speech(pcm, -40, 200), (28800, 83200))
+
+    def test_inner_silence_is_kept(self):
+        pcm = silence(1) + tone(1) + silence(2) + tone(1) + silence(1)
+        self.assertEqual(find_speech(pcm, -40, 0), (16000, 80000))
+
+    def test_bounds_clamped_to_note(self):
+        pcm = tone(1) + silence(0.1)
+        self.assertEqual(find_speech(pcm, -40, 500), (0, len(pcm)))
+
+    def test_silent_note(self):
+        self.assertIsNone(find_speech(silence(1, value=3), -40, 200))
+        self.assertIsNone(find_speech([], -40, 200))
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeChat:
+    def __init__(self):
+        self.history = []
+        self.calls = 0
+
+    def send_message(self, content, stream=False):
+        self.calls += 1
+        return [FakeChunk("Reponse "), FakeChunk(str(self.calls))]
+
+
+class ChatStreamIdempotencyTests(SimpleTestCase):
+
+    def setUp(self):
+        self.chat = FakeChat()
+        self.key = uuid.uuid4().hex
+        patches = [
+            mock.patch("chat.views.build_content_and_chat", lambda request: (self.chat, ["Bonjour"], "s", None, [])),
+            mock.patch("chat.views.TURN_LOG"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def post(self):
+        request = APIRequestFactory().post(
+            "/api/chat/stream/", {"message": "Bonjour"}, format="json", HTTP_IDEMPOTENCY_KEY=self.key
+        )
+        response = ChatStreamView.as_view()(request)
+        body = "".join(
+            chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in response.streaming_content
+        )
+        return response, body
+
+    def test_duplicate_replays_stream(self):
+        _, first = self.post()
+        response, second = self.post()
+        self.assertEqual(self.chat.calls, 1)
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertIn("Reponse 1", second)
+        self.assertEqual(first, second)
+
+    def test_retry_after_stream_expired_generates_once(self):
+        self.post()
+        with STREAMS._lock:
+            STREAMS._streams.clear()
+        _, body = self.post()
+        response, replayed = self.post()
+        self.assertEqual(self.chat.calls, 2)
+        self.assertIn("Reponse 2", body)
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertIn("Reponse 2", replayed)
+
+
+def fingerprint(value, text=""):
+    photo = PhotoFingerprint.__new__(PhotoFingerprint)
+    photo.hash = value
+    photo.intent = normalize_intent(text)
+    return photo
+
+
+class PhotoIndexTests(TestCase):
+
+    def test_reuse_requires_same_intent_and_close_hash(self):
+        index = PhotoIndex()
+        index.add(fingerprint(0b1111, "Quelle maladie ?"), "Pourriture brune")
+        self.assertEqual(index.lookup(fingerprint(0b1110, "quelle maladie")), ("Pourriture brune", True))
+        self.assertEqual(index.lookup(fingerprint(0b1111, "Combien d'engrais ?")), ("Pourriture brune", False))
+        self.assertEqual(index.lookup(fingerprint(0b1111 ^ 0xFF0, "quelle maladie")), ("Pourriture brune", False))
+        self.assertEqual(index.lookup(fingerprint(0b1111 ^ 0xFFFF0, "quelle maladie")), (None, False))
+
+    def test_signed_hash_conversion(self):
+        for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+            signed = _to_signed(value)
+            self.assertGreaterEqual(signed, -(1 << 63))
+            self.assertLess(signed, 1 << 63)
+            self.assertEqual(_to_unsigned(signed), value)
+
+    def test_reload_after_restart(self):
+        value = (1 << 64) - 3  # bit de poids fort : stocké négatif
+        PhotoIndex().add(fingerprint(value), "Mildiou")
+        self.assertLess(PhotoDiagnosis.objects.get().phash, 0)
+        self.assertEqual(PhotoIndex().lookup(fingerprint(value)), ("Mildiou", True))
+
+
+class PhotoReuseTests(TestCase):
+
+    def setUp(self):
+        self.index = PhotoIndex()
+        patch = mock.patch("chat.views.PHOTO_INDEX", self.index)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def generate(self, chat, content, photo):
+        buffer = StreamBuffer("s")
+        buffer.FLUSH_WINDOW = 0
+        _generate(buffer, chat, content, photo, {"started": 0})
+        return "".join(event["text"] for event in buffer.events if isinstance(event, dict) and "text" in event)
+
+    def test_first_turn_reuses_and_records_history(self):
+        self.index.add(fingerprint(42), "Pourriture brune")
+        chat = FakeChat()
+        content = ["photo"]
+        self.assertEqual(self.generate(chat, content, fingerprint(42)), "Pourriture brune")
+        self.assertEqual(chat.calls, 0)
+        self.assertEqual(chat.history, [
+            {"role": "user", "parts": ["photo"]},
+            {"role": "model", "parts": ["Pourriture brune"]},
+        ])
+
+    def test_first_turn_is_indexed(self):
+        chat = FakeChat()
+        self.generate(chat, ["photo"], fingerprint(42))
+        self.assertEqual(chat.calls, 1)
+        self.assertEqual(self.index.lookup(fingerprint(42)), ("Reponse 1", True))
+
+    def test_follow_up_only_gets_context_and_is_not_indexed(self):
+        self.index.add(fingerprint(42), "Pourriture brune")
+        chat = FakeChat()
+        chat.history = [{"role": "user", "parts": ["Mon cacao"]}, {"role": "model", "parts": ["D'accord"]}]
+        content = ["photo"]
+        self.generate(chat, content, fingerprint(42))
+        self.assertEqual(chat.calls, 1)
+        self.assertIn("Pourriture brune", content[-1])
+        self.assertEqual(self.index.lookup(fingerprint(42)), ("Pourriture brune", True))
+
+    def test_remember_reused_keeps_previous_turns(self):
+        chat = FakeChat()
+        chat.history = [{"role": "user", "parts": ["Bonjour"]}]
+        remember_reused(chat, ["photo"], "Mildiou")
+        self.assertEqual([turn["role"] for turn in chat.history], ["user", "user", "model"])
+
+
+TURN = {"endpoint": "chat", "status": 200, "latency_ms": 120}
+
+
+class TurnLogWriterTests(TestCase):
+
+    def writer(self, **options):
+        with override_settings(CHAT_TURN_LOG={"queue_size": 100, "batch_size": 3, "flush_interval": 0.05, **options}):
+            writer = TurnLogWriter()
+        writer._ensure_thread = lambda: None  # lots déclenchés à la main
+        return writer
+
+    def test_batch_limited_by_size_then_interval(self):
+        writer = self.writer()
+        for _ in range(4):
+            writer.log(session_id="s", **TURN)
+        self.assertEqual(len(writer._collect()), 3)
+        started = time.monotonic()
+        self.assertEqual(len(writer._collect()), 1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+    def test_full_queue_drops_without_blocking(self):
+        writer = self.writer(queue_size=2)
+        started = time.monotonic()
+        for _ in range(5):
+            writer.log(**TURN)
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(writer.snapshot(), {"queued": 2, "written": 0, "dropped": 3})
+
+    def test_database_errors_are_counted(self):
+        writer = self.writer()
+        with mock.patch.object(ChatTurn.objects, "bulk_create", side_effect=RuntimeError("base verrouillée")):
+            writer._flush([{**TURN, "session_id": "s", "created_at": None}] * 2)
+        self.assertEqual((writer.written, writer.dropped), (0, 2))
+
+    def test_drain_writes_pending_turns(self):
+        writer = self.writer()
+        for index in range(5):
+            writer.log(session_id=f"s{index}", error="x" * 500, **TURN)
+        writer.drain()
+        self.assertEqual(writer.snapshot(), {"queued": 0, "written": 5, "dropped": 0})
+        self.assertEqual(ChatTurn.objects.count(), 5)
+        self.assertEqual(len(ChatTurn.objects.first().error), ChatTurn._meta.get_field("error").max_length)
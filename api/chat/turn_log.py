@@ -0,0 +1,123 @@
+# chat/turn_log.py
+
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import ChatTurn
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "queue_size": 10000,
+    "batch_size": 500,
+    "flush_interval": 2.0,  # secondes
+}
+
+ERROR_MAX_LENGTH = ChatTurn._meta.get_field("error").max_length
+SESSION_MAX_LENGTH = ChatTurn._meta.get_field("session_id").max_length
+
+
+class TurnLogWriter:
+    """
+    Journal des échanges chat en écriture différée (write-behind).
+
+    `log()` ne fait qu'un put_nowait dans une file bornée : aucune latence base
+    de données sur le chemin de la réponse. Un thread vide la file par lots
+    (bulk_create) toutes les `flush_interval` secondes ou dès `batch_size`
+    entrées. File pleine ou base indisponible : les entrées sont abandonnées
+    et comptées (`dropped`), jamais bloquantes.
+    """
+
+    def __init__(self):
+        options = {**DEFAULT_OPTIONS, **getattr(settings, "CHAT_TURN_LOG", {})}
+        self.enabled = options["enabled"]
+        self.batch_size = options["batch_size"]
+        self.flush_interval = options["flush_interval"]
+        self._queue = queue.Queue(maxsize=options["queue_size"])
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self._dropped_reported = 0
+
+    def log(self, **fields):
+        if not self.enabled:
+            return
+        fields.setdefault("created_at", timezone.now())
+        fields["session_id"] = str(fields.get("session_id") or "default")[:SESSION_MAX_LENGTH]
+        if fields.get("error"):
+            fields["error"] = str(fields["error"])[:ERROR_MAX_LENGTH]
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1  # approximatif sans verrou : simple indicateur
+            return
+        self._ensure_thread()
+
+    def snapshot(self):
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="chat-turn-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self._flush(batch)
+            connection.close()
+
+    def _collect(self):
+        """Attend une première entrée puis complète le lot jusqu'à l'échéance"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            ChatTurn.objects.bulk_create([ChatTurn(**fields) for fields in batch], batch_size=self.batch_size)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            self._dropped_reported += len(batch)
+            logger.error(f"Journal chat : {len(batch)} échange(s) non enregistré(s) ({e})")
+        if self.dropped != self._dropped_reported:
+            logger.warning(f"Journal chat : {self.dropped - self._dropped_reported} échange(s) abandonné(s) (file pleine)")
+            self._dropped_reported = self.dropped
+
+    def drain(self):
+        """Écrit ce qui reste en file (arrêt du processus)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(batch), self.batch_size):
+            self._flush(batch[start:start + self.batch_size])
+
+
+TURN_LOG = TurnLogWriter()
+atexit.register(TURN_LOG.drain)
@@ -1,22 +1,29 @@
 # chat/views.py
 
-import os
 import json
 import base64
 import requests
+import time
+import logging
 import mimetypes
-import google.generativeai as genai
-from django.http import StreamingHttpResponse
+import threading
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
-from PIL import Image
 from io import BytesIO
 
-from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable, InternalServerError, DeadlineExceeded
+from .audio import AUDIO
+from .idempotency import IDEMPOTENCY, IdempotencyConflict, idempotency_key, request_fingerprint
+from .gemini import errors, get_model, lazy_import
+from .photo_index import PHOTO_INDEX, PhotoFingerprint
+from .sse import STREAMS, format_event, parse_last_event_id, stream_events
+from .turn_log import TURN_LOG
 
-# Configuration Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Le SDK Gemini et PIL sont chargés à la demande (voir chat/gemini.py)
+
+logger = logging.getLogger(__name__)
 
 # Stockage des sessions de chat
 ACTIVE_CHATS = {}
@@ -43,10 +50,24 @@ Reste pratique et efficace. Pas de longues phrases motivantes inutiles.
 Si sujet hors agriculture : dis-le poliment.
 """
 
+def get_chat_model():
+    """Modèle partagé par tout le processus (préchauffé au démarrage du worker)"""
+    return get_model(system_instruction)
+
+
 def build_content_and_chat(request):
+    Image = lazy_import("PIL.Image")
     user_text = ""
     session_id = "default"
     content = []
+    audio = []  # rapports de prétraitement des notes vocales
+
+    def add_audio(audio_data, mime_type):
+        # AudioRejected (ValueError) remonte telle quelle : réponse 400
+        part, report = AUDIO.process(audio_data, mime_type)
+        content.append(part)
+        if report is not None:
+            audio.append(report)
 
     # === Mode multipart (Flutter) ===
     if request.content_type and 'multipart/form-data' in request.content_type:
@@ -61,6 +82,7 @@ def build_content_and_chat(request):
             img_file = request.FILES['image']
             try:
                 img = Image.open(img_file)
+                img.load()  # le fichier uploadé peut être fermé avant la fin de la génération
                 content.append(img)
             except Exception as e:
                 raise ValueError(f"Image invalide: {e}")
@@ -72,7 +94,7 @@ def build_content_and_chat(request):
             mime_type, _ = mimetypes.guess_type(audio_file.name)
             if not mime_type or not mime_type.startswith("audio/"):
                 mime_type = "audio/m4a"
-            content.append({"mime_type": mime_type, "data": audio_data})
+            add_audio(audio_data, mime_type)
 
     # === Mode JSON (web) ===
     else:
@@ -115,84 +137,331 @@ def build_content_and_chat(request):
                 mime_type, _ = mimetypes.guess_type(audio_url)
                 if not mime_type or not mime_type.startswith("audio/"):
                     mime_type = "audio/mpeg"
-                content.append({"mime_type": mime_type, "data": audio_data})
             except Exception as e:
                 raise ValueError(f"Impossible de télécharger l'audio: {e}")
+            add_audio(audio_data, mime_type)
 
         if audio_b64:
             try:
                 if "," in audio_b64:
                     audio_b64 = audio_b64.split(",")[1]
                 audio_data = base64.b64decode(audio_b64)
-                content.append({"mime_type": "audio/mpeg", "data": audio_data})
             except Exception as e:
                 raise ValueError(f"Audio base64 invalide: {e}")
+            add_audio(audio_data, "audio/mpeg")
 
     if not content:
         raise ValueError("Envoie un message, une photo ou une note vocale.")
 
     # Création ou récupération du chat
     if session_id not in ACTIVE_CHATS:
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash-lite",  # Plus stable pour les quotas
-            system_instruction=system_instruction,
-        )
-        ACTIVE_CHATS[session_id] = model.start_chat()
+        ACTIVE_CHATS[session_id] = get_chat_model().start_chat()
 
     chat = ACTIVE_CHATS[session_id]
-    return chat, content, session_id
+
+    # Empreinte perceptuelle : seulement pour une photo seule (sans note vocale)
+    images = [part for part in content if isinstance(part, Image.Image)]
+    photo = None
+    if len(images) == 1 and not any(isinstance(part, dict) for part in content):
+        photo = PhotoFingerprint(images[0], user_text)
+
+    return chat, content, session_id, photo, audio
+
+
+def match_photo(photo, content, fresh=True):
+    """
+    Cherche un diagnostic récent pour une photo quasi identique.
+    Renvoie le diagnostic s'il est réutilisable tel quel ; sinon, joint le
+    diagnostic d'une photo proche comme contexte et renvoie None.
+    Dans une conversation déjà entamée (fresh=False), la réponse attendue dépend
+    des échanges précédents : le diagnostic n'est joint que comme contexte.
+    """
+    if photo is None:
+        return None
+    diagnosis, reusable = PHOTO_INDEX.lookup(photo)
+    if reusable and fresh:
+        return diagnosis
+    if diagnosis:
+        content.append(f"(Contexte : diagnostic précédent pour une photo très similaire)\n{diagnosis}")
+    return None
+
+
+def remember_reused(chat, content, diagnosis):
+    """
+    Ajoute à l'historique de la session la question (photo comprise) et le
+    diagnostic réutilisé, comme si Gemini avait répondu : une question de suivi
+    (« et comment traiter ? ») garde ainsi son contexte.
+    """
+    try:
+        chat.history = [
+            *chat.history,
+            {"role": "user", "parts": list(content)},
+            {"role": "model", "parts": [diagnosis]},
+        ]
+    except Exception as e:
+        logger.warning(f"Historique non mis à jour après réutilisation d'un diagnostic : {e}")
+
+
+def request_bytes(request):
+    return int(request.META.get("CONTENT_LENGTH") or 0)
+
+
+def describe_turn(content):
+    """Tailles des médias envoyés à Gemini, pour le journal des échanges"""
+    return {
+        "text_chars": sum(len(part) for part in content if isinstance(part, str)),
+        "image_count": sum(1 for part in content if not isinstance(part, (str, dict))),
+        "audio_bytes": sum(len(part["data"]) for part in content if isinstance(part, dict)),
+    }
+
+
+def usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "response_tokens": getattr(usage, "candidates_token_count", None),
+    }
+
+
+def elapsed_ms(started):
+    return round((time.monotonic() - started) * 1000)
 
 
 class ChatSimpleView(APIView):
+    """
+    Réponse complète en une fois.
+    Avec un en-tête Idempotency-Key, un renvoi de la même requête (réseau mobile
+    instable) réutilise le résultat de la première au lieu de rappeler Gemini.
+    """
     parser_classes = [JSONParser, FormParser, MultiPartParser]
 
     def post(self, request):
+        key = idempotency_key(request, "chat")
+        if key is None:
+            payload, status = self._send(request)
+            return Response(payload, status=status)
+
+        fingerprint = request_fingerprint(request)
+        try:
+            entry, owner = IDEMPOTENCY.begin(key, fingerprint)
+        except IdempotencyConflict as e:
+            return Response({"error": str(e)}, status=422)
+        if not owner:
+            result = entry.wait(IDEMPOTENCY.WAIT_TIMEOUT)
+            if result is None:
+                return Response({"error": "⏳ Requête identique déjà en cours. Réessaie dans un instant."}, status=409)
+            payload, status = result
+            return Response(payload, status=status, headers={"Idempotent-Replayed": "true"})
+
+        result = (None, 500)
+        try:
+            result = self._send(request)
+        finally:
+            IDEMPOTENCY.complete(key, entry, result, keep=result[1] == 200)
+        payload, status = result
+        return Response(payload, status=status)
+
+    def _send(self, request):
+        started = time.monotonic()
+        turn = {"session_id": "default", "request_bytes": request_bytes(request)}
+        payload, status = self._reply(request, turn)
+        TURN_LOG.log(
+            endpoint="chat", status=status, latency_ms=elapsed_ms(started), error=payload.get("error", ""), **turn
+        )
+        return payload, status
+
+    def _reply(self, request, turn):
         try:
-            chat, content, session_id = build_content_and_chat(request)
+            chat, content, session_id, photo, audio = build_content_and_chat(request)
+            turn.update(session_id=session_id, **describe_turn(content))
+
+            fresh = not chat.history  # seul un premier échange est indexé ou réutilisé
+            diagnosis = match_photo(photo, content, fresh)
+            if diagnosis is not None:
+                turn["reused_diagnosis"] = True
+                remember_reused(chat, content, diagnosis)
+                return {
+                    "response": diagnosis,
+                    "session_id": session_id,
+                    "reused_diagnosis": True
+                }, 200
+
             response = chat.send_message(content, stream=False)
-            return Response({
+            turn.update(usage_tokens(response))
+            if photo is not None and fresh:
+                PHOTO_INDEX.add(photo, response.text)
+            payload = {
                 "response": response.text,
                 "session_id": session_id
-            })
+            }
+            if audio:
+                payload["audio"] = audio
+            return payload, 200
         except ValueError as e:
-            return Response({"error": str(e)}, status=400)
-        except ResourceExhausted:
-            return Response({"error": "⚠️ Limite quotidienne atteinte. Réessaie demain."}, status=429)
+            return {"error": str(e)}, 400
+        except errors().ResourceExhausted:
+            return {"error": "⚠️ Limite quotidienne atteinte. Réessaie demain."}, 429
         except Exception as e:
-            return Response({"error": "❌ Erreur temporaire du serveur IA."}, status=500)
+            return {"error": "❌ Erreur temporaire du serveur IA."}, 500
+
+
+def generate_into(buffer, chat, content, photo=None, turn=None, on_failure=None):
+    """
+    Exécuté dans un thread : la génération continue même si le client se déconnecte.
+    `on_failure` est appelé avant la diffusion de l'erreur (ex. oubli de la clé d'idempotence).
+    """
+    turn = {"started": time.monotonic()} if turn is None else turn
+    try:
+        _generate(buffer, chat, content, photo, turn, on_failure)
+    finally:
+        started = turn.pop("started")
+        if "endpoint" in turn:
+            TURN_LOG.log(latency_ms=elapsed_ms(started), **turn)
+        connection.close()  # connexion ouverte par ce thread (index photo)
+
+
+def _generate(buffer, chat, content, photo, turn, on_failure=None):
+    turn["status"] = 200
+    try:
+        fresh = not chat.history  # seul un premier échange est indexé ou réutilisé
+        diagnosis = match_photo(photo, content, fresh)
+        if diagnosis is not None:
+            turn["reused_diagnosis"] = True
+            remember_reused(chat, content, diagnosis)
+            buffer.write(diagnosis)
+            buffer.finish()
+            return
+
+        response = chat.send_message(content, stream=True)
+
+        parts = []
+        for chunk in response:
+            if chunk.text:
+                if not parts:
+                    turn["first_token_ms"] = elapsed_ms(turn["started"])
+                parts.append(chunk.text)
+                buffer.write(chunk.text)
+
+        turn.update(usage_tokens(response))
+        buffer.finish()
+        if photo is not None and fresh:
+            PHOTO_INDEX.add(photo, "".join(parts))
+        return
+
+    except errors().ResourceExhausted:
+        turn["status"] = 429
+        error_msg = "⚠️ Limite quotidienne atteinte.\nRéessaie demain ou dans quelques heures. Merci pour ta patience !"
+
+    except (errors().ServiceUnavailable, errors().InternalServerError, errors().DeadlineExceeded) as e:
+        turn["status"] = 503
+        if "overloaded" in str(e).lower():
+            error_msg = "⏳ Serveur IA temporairement surchargé.\nRéessaie dans quelques minutes."
+        else:
+            error_msg = "❌ Erreur temporaire du serveur IA.\nRéessaie bientôt."
+
+    except Exception as e:
+        turn["status"] = 500
+        error_msg = "❌ Une erreur est survenue. Réessaie plus tard."
+
+    turn["error"] = error_msg
+    buffer.status = turn["status"]
+    if on_failure is not None:
+        on_failure()  # un renvoi avec la même clé relancera la génération
+    buffer.push({'error': error_msg})
+    buffer.finish(None)
 
 
 class ChatStreamView(APIView):
+    """
+    Streaming SSE reprenable.
+
+    Chaque événement porte un id "<stream_id>:<seq>". Un client qui se reconnecte
+    avec l'en-tête Last-Event-ID (POST ou GET, comme EventSource) reprend après
+    le dernier événement reçu, sans relancer de génération Gemini.
+    Un renvoi avec le même Idempotency-Key rejoue le flux de la première requête.
+    """
     parser_classes = [JSONParser, FormParser, MultiPartParser]
 
-    def post(self, request):
-        def event_stream():
-            try:
-                chat, content, session_id = build_content_and_chat(request)
-                response = chat.send_message(content, stream=True)
-
-                for chunk in response:
-                    if chunk.text:
-                        yield f"data: {json.dumps({'text': chunk.text})}\n\n"
-
-                yield "data: [DONE]\n\n"
-
-            except ResourceExhausted:
-                error_msg = "⚠️ Limite quotidienne atteinte.\nRéessaie demain ou dans quelques heures. Merci pour ta patience !"
-                yield f"data: {json.dumps({'error': error_msg})}\n\n"
-
-            except (ServiceUnavailable, InternalServerError, DeadlineExceeded) as e:
-                if "overloaded" in str(e).lower():
-                    error_msg = "⏳ Serveur IA temporairement surchargé.\nRéessaie dans quelques minutes."
-                else:
-                    error_msg = "❌ Erreur temporaire du serveur IA.\nRéessaie bientôt."
-                yield f"data: {json.dumps({'error': error_msg})}\n\n"
+    HEARTBEAT_INTERVAL = 15  # secondes
 
-            except ValueError as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    def post(self, request):
+        resumed = self._resume(request)
+        if resumed is not None:
+            return resumed
 
-            except Exception as e:
-                error_msg = "❌ Une erreur est survenue. Réessaie plus tard."
-                yield f"data: {json.dumps({'error': error_msg})}\n\n"
+        key = idempotency_key(request, "stream")
+        if key is None:
+            return self._start(request)[0]
 
-        return StreamingHttpResponse(event_stream(), content_type="text/event-stream")
\ No newline at end of file
+        fingerprint = request_fingerprint(request)
+        while True:
+            try:
+                entry, owner = IDEMPOTENCY.begin(key, fingerprint)
+            except IdempotencyConflict as e:
+                return Response({"error": str(e)}, status=422)
+            if owner:
+                break
+            stream_id = entry.wait(IDEMPOTENCY.WAIT_TIMEOUT)
+            buffer = STREAMS.get(stream_id) if stream_id else None
+            if buffer is not None:
+                response = self._sse_response(stream_events(buffer, heartbeat_interval=self.HEARTBEAT_INTERVAL))
+                response["Idempotent-Replayed"] = "true"
+                return response
+            if not entry.event.is_set():
+                return Response({"error": "⏳ Requête identique déjà en cours. Réessaie dans un instant."}, status=409)
+            # Flux expiré ou évincé : on oublie l'entrée pour que ce renvoi devienne
+            # propriétaire et enregistre son propre flux (une seule génération)
+            IDEMPOTENCY.forget(key, entry)
+
+        buffer = None
+        try:
+            response, buffer = self._start(request, on_failure=lambda: IDEMPOTENCY.forget(key, entry))
+        finally:
+            stream_id = buffer.stream_id if buffer is not None else None
+            IDEMPOTENCY.complete(key, entry, stream_id, keep=stream_id is not None)
+        return response
+
+    def _start(self, request, on_failure=None):
+        """Lance la génération ; renvoie (réponse, tampon) — tampon None si requête invalide"""
+        started = time.monotonic()
+        try:
+            chat, content, session_id, photo, audio = build_content_and_chat(request)
+        except ValueError as e:
+            TURN_LOG.log(
+                endpoint="stream", session_id="default", status=400, latency_ms=elapsed_ms(started),
+                request_bytes=request_bytes(request), error=str(e),
+            )
+            return self._sse_response(iter([format_event({'error': str(e)})])), None
+
+        turn = {
+            "endpoint": "stream", "session_id": session_id, "started": started,
+            "request_bytes": request_bytes(request), **describe_turn(content),
+        }
+        buffer = STREAMS.create()
+        threading.Thread(
+            target=generate_into, args=(buffer, chat, content, photo, turn, on_failure), daemon=True
+        ).start()
+        response = self._sse_response(stream_events(buffer, heartbeat_interval=self.HEARTBEAT_INTERVAL))
+        response.generation = buffer  # place d'admission libérée à la fin de la génération
+        if audio:
+            response["X-Audio-Preprocessing"] = json.dumps(audio, separators=(",", ":"))
+        return response, buffer
+
+    def get(self, request):
+        resumed = self._resume(request)
+        # 204 : indique à EventSource de ne plus se reconnecter
+        return resumed if resumed is not None else HttpResponse(status=204)
+
+    def _resume(self, request):
+        last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+        stream_id, seq = parse_last_event_id(last_event_id)
+        buffer = STREAMS.get(stream_id) if stream_id else None
+        if buffer is None:
+            return None
+        return self._sse_response(stream_events(buffer, seq, heartbeat_interval=self.HEARTBEAT_INTERVAL))
+
+    def _sse_response(self, events):
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,347 @@
+# gemini_api/admission.py
+
+import json
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+
+class Rejected(Exception):
+    """Requête refusée par le contrôle d'admission"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("client_id", "keys", "event", "granted")
+
+    def __init__(self, client_id, keys):
+        self.client_id = client_id
+        self.keys = keys
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdaptiveLimiter:
+    """
+    Limite de concurrence adaptative pour un endpoint.
+
+    - au plus `limit` requêtes en cours ; les suivantes attendent dans une file bornée ;
+    - la file est servie à tour de rôle par client (un client bavard ne bloque pas les autres) ;
+    - une requête dont l'attente estimée dépasse `max_wait` est refusée tout de suite ;
+    - la limite augmente doucement tant que la latence reste proche de la latence
+      de référence, et diminue franchement quand elle se dégrade (AIMD).
+
+    Seules les réponses réussies et plus lentes que `min_sample` (appels réels à
+    l'amont) alimentent le gradient : erreurs 4xx, hits de cache et diagnostics
+    réutilisés fausseraient la référence. Celle-ci est le 10e centile des
+    `baseline_window` derniers échantillons, pas un minimum courant.
+    Chaque session a sa limite `per_client` ; l'adresse du client (NAT opérateur,
+    proxy) a en plus une limite `per_address`, plus large, qui s'applique à toutes
+    ses sessions : changer de session_id ne permet pas de la dépasser.
+    """
+
+    BASELINE_PERCENTILE = 0.1
+
+    def __init__(self, name, limit=8, min_limit=2, max_limit=64, queue_size=32,
+                 per_client=4, per_address=None, max_wait=5.0, latency_tolerance=2.0, backoff=0.9,
+                 min_sample=0.05, baseline_window=200):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue_size
+        self.per_client = per_client
+        self.per_address = per_client * 8 if per_address is None else per_address
+        self.max_wait = max_wait
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.min_sample = min_sample
+
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.avg_latency = None   # EWMA (s)
+        self._samples = deque(maxlen=baseline_window)  # latences récentes de l'amont
+        self._per_client = {}
+        self._queues = OrderedDict()  # client_id -> deque de _Waiter (tourniquet)
+        self._lock = threading.Lock()
+
+    def acquire(self, client_id, max_wait=None, address=None):
+        """
+        Obtient une place ou lève Rejected ; renvoie l'instant d'admission.
+        `client_id` ordonne le tourniquet ; `address` ("addr:...") plafonne en plus
+        l'ensemble des sessions d'une même adresse.
+        """
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        keys = self._keys(client_id, address)
+
+        with self._lock:
+            if any(self._per_client.get(key, 0) >= self._client_limit(key) for key in keys):
+                self.rejected += 1
+                raise Rejected("client_limit", self._retry_after())
+
+            if self.in_flight < int(self.limit) and not self.queued:
+                self.in_flight += 1
+                self._hold(keys)
+                return time.monotonic()
+
+            if self.queued >= self.queue_size:
+                self.rejected += 1
+                raise Rejected("queue_full", self._retry_after())
+
+            estimated_wait = self._estimated_wait(self.queued + 1)
+            if estimated_wait > max_wait:
+                self.rejected += 1
+                raise Rejected("deadline", self._retry_after(estimated_wait))
+
+            waiter = _Waiter(client_id, keys)
+            self._queues.setdefault(client_id, deque()).append(waiter)
+            self._hold(keys)
+            self.queued += 1
+
+        if waiter.event.wait(max_wait):
+            return time.monotonic()
+
+        with self._lock:
+            if waiter.granted:  # place accordée juste à l'expiration du délai
+                return time.monotonic()
+            self._queues[client_id].remove(waiter)
+            if not self._queues[client_id]:
+                del self._queues[client_id]
+            self._release_keys(keys)
+            self.queued -= 1
+            self.rejected += 1
+            raise Rejected("timeout", self._retry_after())
+
+    def release(self, client_id, latency, ok=True, sample=True, address=None):
+        """
+        Libère la place. `ok=False` (erreur 5xx) réduit la limite ; `sample=False`
+        (réponse 4xx, 204...) n'alimente pas le calcul de latence.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self._release_keys(self._keys(client_id, address))
+            self._update_limit(latency, ok, sample)
+            self._dispatch()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "avg_latency": round(self.avg_latency, 3) if self.avg_latency else None,
+                "baseline": round(self._baseline(), 3) if self._samples else None,
+            }
+
+    def _client_limit(self, client_id):
+        return self.per_client if client_id.startswith("session:") else self.per_address
+
+    @staticmethod
+    def _keys(client_id, address):
+        return (client_id,) if address is None or address == client_id else (client_id, address)
+
+    def _hold(self, keys):
+        for key in keys:
+            self._per_client[key] = self._per_client.get(key, 0) + 1
+
+    def _release_keys(self, keys):
+        for key in keys:
+            count = self._per_client.get(key, 0) - 1
+            if count > 0:
+                self._per_client[key] = count
+            else:
+                self._per_client.pop(key, None)
+
+    def _dispatch(self):
+        """Réveille les attentes, un client après l'autre"""
+        while self._queues and self.in_flight < int(self.limit):
+            client_id, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            del self._queues[client_id]
+            if waiters:
+                self._queues[client_id] = waiters  # repasse en fin de tourniquet
+            self.queued -= 1
+            self.in_flight += 1  # les places client et adresse sont comptées depuis la mise en file
+            waiter.granted = True
+            waiter.event.set()
+
+    def _update_limit(self, latency, ok, sample):
+        if not ok:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            return
+        if not sample or latency < self.min_sample:
+            return
+
+        self._samples.append(latency)
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+        if self.avg_latency > self._baseline() * self.latency_tolerance:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif self.in_flight + 1 >= int(self.limit):
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _baseline(self):
+        """Latence de référence : bas centile de la fenêtre (suit un amont durablement plus lent)"""
+        ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * self.BASELINE_PERCENTILE)]
+
+    def _estimated_wait(self, position):
+        if not self.avg_latency:
+            return 0.0
+        return math.ceil(position / max(int(self.limit), 1)) * self.avg_latency
+
+    def _retry_after(self, estimated_wait=None):
+        wait = estimated_wait if estimated_wait is not None else self._estimated_wait(self.queued + 1)
+        return max(1, math.ceil(wait))
+
+
+class AdmissionControlMiddleware:
+    """
+    Protège les endpoints adossés à Gemini / OpenWeather : au-delà de la capacité,
+    répond vite 503 + Retry-After au lieu de bloquer tous les workers.
+    Les chemins non configurés (admin, health checks...) ne sont pas limités.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Nombre de proxys inverses de confiance devant Django (X-Forwarded-For)
+        self.trusted_proxies = getattr(settings, "ADMISSION_TRUSTED_PROXIES", 0)
+        rules = getattr(settings, "ADMISSION_CONTROL", {})
+        # Préfixe le plus long d'abord (/api/chat/stream/ avant /api/chat/)
+        self.limiters = [
+            (options["path"], AdaptiveLimiter(name, **{k: v for k, v in options.items() if k != "path"}))
+            for name, options in sorted(rules.items(), key=lambda item: len(item[1]["path"]), reverse=True)
+        ]
+
+    def __call__(self, request):
+        limiter = self._limiter_for(request.path)
+        if limiter is None or request.method == "OPTIONS":
+            return self.get_response(request)
+
+        client_id = self._client_id(request)
+        address = f"addr:{self._client_address(request)}"
+        try:
+            started = limiter.acquire(client_id, self._client_deadline(request), address)
+        except Rejected as e:
+            logger.warning(f"Admission refusée ({limiter.name}, {e.reason}) : {limiter.snapshot()}")
+            response = JsonResponse({
+                "error": "⏳ Serveur temporairement surchargé. Réessaie dans quelques instants."
+            }, status=503)
+            response["Retry-After"] = str(e.retry_after)
+            return response
+
+        try:
+            response = self.get_response(request)
+        except Exception:
+            limiter.release(client_id, time.monotonic() - started, ok=False, address=address)
+            raise
+
+        generation = getattr(response, "generation", None)
+        if generation is not None:
+            # Génération en arrière-plan (chat/sse.py) : la place est conservée jusqu'à
+            # la fin de l'appel Gemini, même si le client se déconnecte avant
+            generation.add_done_callback(
+                lambda buffer: self._release_generation(buffer, limiter, client_id, address, started)
+            )
+        elif getattr(response, "streaming", False):
+            # La place est conservée jusqu'à la fin du flux ; sa durée dépend de la
+            # lecture du client, pas de l'amont : pas d'échantillon de latence
+            response.streaming_content = self._release_after(
+                response.streaming_content, limiter, client_id, address, started
+            )
+        else:
+            limiter.release(
+                client_id, time.monotonic() - started,
+                ok=response.status_code < 500, sample=200 <= response.status_code < 300 and response.status_code != 204,
+                address=address,
+            )
+        return response
+
+    def _limiter_for(self, path):
+        for prefix, limiter in self.limiters:
+            if path.startswith(prefix):
+                return limiter
+        return None
+
+    @staticmethod
+    def _release_after(content, limiter, client_id, address, started):
+        try:
+            yield from content
+        finally:
+            limiter.release(client_id, time.monotonic() - started, sample=False, address=address)
+
+    @staticmethod
+    def _release_generation(buffer, limiter, client_id, address, started):
+        """
+        Fin d'une génération : l'échantillon est le délai jusqu'au premier morceau
+        de texte (santé de l'amont), pas la durée totale qui dépend de la longueur
+        de la réponse.
+        """
+        first_write_at = buffer.first_write_at
+        limiter.release(
+            client_id, (first_write_at or time.monotonic()) - started,
+            ok=buffer.status < 500, sample=buffer.status == 200 and first_write_at is not None,
+            address=address,
+        )
+
+    def _client_id(self, request):
+        """
+        Clé d'équité : la session de chat de la requête si elle en a une,
+        sinon l'adresse du client (limite `per_address`, plus large).
+        """
+        session_id = self._session_id(request)
+        if session_id and session_id != "default":
+            return f"session:{str(session_id)[:100]}"
+        return f"addr:{self._client_address(request)}"
+
+    def _client_address(self, request):
+        """
+        Adresse du client. X-Forwarded-For n'est lu que derrière des proxys de
+        confiance (ADMISSION_TRUSTED_PROXIES) : on prend l'entrée ajoutée par le
+        plus éloigné d'entre eux, les entrées précédentes étant falsifiables.
+        """
+        forwarded = request.headers.get("X-Forwarded-For")
+        if self.trusted_proxies and forwarded:
+            hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+            if hops:
+                return hops[-min(self.trusted_proxies, len(hops))]
+        return request.META.get("REMOTE_ADDR", "unknown")
+
+    @staticmethod
+    def _session_id(request):
+        """session_id envoyé par l'application : en-tête, paramètre GET, champ de formulaire ou JSON"""
+        session_id = request.headers.get("X-Session-Id") or request.GET.get("session_id")
+        if session_id or request.method != "POST":
+            return session_id
+        content_type = request.content_type or ""
+        try:
+            if content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+                return request.POST.get("session_id")
+            if content_type == "application/json":
+                data = json.loads(request.body or b"{}")
+                return data.get("session_id") if isinstance(data, dict) else None
+        except Exception:
+            return None
+        return None
+
+    @staticmethod
+    def _client_deadline(request):
+        """Délai d'attente accepté par le client (en-tête X-Request-Timeout, secondes)"""
+        try:
+            return float(request.headers["X-Request-Timeout"])
+        except (KeyError, ValueError):
+            return None
@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from gemini_api import boot
+
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gemini_api.settings')
 
 application = get_asgi_application()
+boot.mark("django_ready")
+
+# Préchauffage du modèle Gemini partagé ; GEMINI_PREWARM=0 pour les workers météo seuls
+if os.getenv("GEMINI_PREWARM", "1") == "1":
+    from chat.gemini import prewarm
+    from chat.views import system_instruction
+
+    prewarm(system_instruction)
+    boot.mark("prewarm_started")
+
+boot.log_report()
@@ -0,0 +1,31 @@
+# gemini_api/boot.py
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Origine des mesures : importé en tout premier par wsgi.py / asgi.py
+BOOT_STARTED = time.perf_counter()
+
+MARKS = {}
+
+
+def mark(name):
+    """Enregistre le temps écoulé (s) depuis le début du démarrage du worker"""
+    MARKS[name] = round(time.perf_counter() - BOOT_STARTED, 4)
+    return MARKS[name]
+
+
+def report():
+    """Rapport de démarrage : étapes du boot et chargements paresseux déjà effectués"""
+    from chat.gemini import LOAD_TIMINGS
+
+    return {
+        "marks": dict(MARKS),
+        "lazy_loads": dict(LOAD_TIMINGS),
+    }
+
+
+def log_report():
+    logger.info(f"Rapport de démarrage : {report()}")
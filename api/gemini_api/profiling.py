@@ -0,0 +1,281 @@
+# gemini_api/profiling.py
+
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HEADER = "X-Profile"            # déclenchement / authentification (valeur = jeton)
+PROFILE_ID_RE = re.compile(r"^\d{13}-[0-9a-f]{8}$")
+
+DEFAULT_OPTIONS = {
+    "sample_rate": 0.0,     # fraction des requêtes profilées automatiquement
+    "token": "",            # jeton de l'en-tête X-Profile et des endpoints de téléchargement
+    "interval_ms": 5,       # période d'échantillonnage des piles
+    "max_profiles": 50,     # taille du tampon circulaire sur disque
+    "max_depth": 128,
+    "dir": None,
+    "exclude": ("/api/profiles/", "/admin/"),
+}
+
+
+def get_options():
+    options = {**DEFAULT_OPTIONS, **getattr(settings, "PROFILING", {})}
+    options["dir"] = Path(options["dir"] or Path(settings.BASE_DIR) / "profiles")
+    return options
+
+
+def authorized(request, options):
+    token = options["token"]
+    supplied = request.headers.get(HEADER, "")
+    return bool(token) and bool(supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+class StackSampler:
+    """
+    Échantillonneur de piles partagé : un seul thread relève, toutes les
+    `interval` secondes, la pile Python des threads en cours de profilage
+    (sys._current_frames) et compte les piles repliées « racine;...;feuille ».
+    Aucun hook de trace : le code profilé s'exécute à vitesse normale.
+    """
+
+    def __init__(self, interval, max_depth):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._targets = {}   # thread id -> Counter de piles
+        self._labels = {}    # code -> libellé « module.py:fonction »
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        stacks = Counter()
+        with self._lock:
+            self._targets[thread_id] = stacks
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return stacks
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = list(self._targets.items())
+                if not targets:
+                    self._wake.clear()
+            if not targets:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in targets:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[self._collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _collapse(self, frame):
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                name = getattr(code, "co_qualname", code.co_name)
+                label = self._labels[code] = f"{os.path.basename(code.co_filename)}:{name}"
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+
+class ProfileStore:
+    """Tampon circulaire de profils sur disque (un fichier JSON par requête)"""
+
+    def __init__(self, root, max_profiles):
+        self.root = Path(root)
+        self.max_profiles = max_profiles
+
+    def save(self, profile):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{profile['id']}.json"
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(profile, ensure_ascii=False))
+        os.replace(tmp, path)
+        for old in self._paths()[:-self.max_profiles]:
+            old.unlink(missing_ok=True)
+
+    def list(self):
+        profiles = []
+        for path in reversed(self._paths()):
+            try:
+                profile = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue  # supprimé entre-temps par un autre worker
+            profile.pop("stacks", None)
+            profiles.append(profile)
+        return profiles
+
+    def load(self, profile_id):
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        try:
+            return json.loads((self.root / f"{profile_id}.json").read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _paths(self):
+        # Identifiants préfixés par l'horodatage en ms : ordre lexical = ordre chronologique
+        return sorted(self.root.glob("*.json")) if self.root.exists() else []
+
+
+def to_collapsed(profile):
+    """Format « piles repliées » (flamegraph.pl, speedscope, inferno)"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(profile["stacks"].items()))
+
+
+def to_speedscope(profile):
+    """Profil échantillonné au format speedscope (https://www.speedscope.app)"""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in profile["stacks"].items():
+        sample = []
+        for label in stack.split(";"):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            sample.append(index[label])
+        samples.append(sample)
+        weights.append(count * profile["interval_ms"])
+    name = f"{profile['method']} {profile['path']}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "gemini_api.profiling",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+class ProfilingMiddleware:
+    """
+    Profilage à la demande des requêtes en production.
+
+    Une requête est profilée si elle est tirée au sort (sample_rate) ou si elle
+    porte l'en-tête X-Profile avec le jeton configuré. Le profil (piles Python
+    du thread de la requête, vue et rendu DRF compris) est enregistré sur
+    disque ; la réponse porte X-Profile-Id. Les générations Gemini en thread
+    de fond (streaming) ne sont pas couvertes.
+    Sans sample_rate ni jeton, le middleware se retire de la chaîne au démarrage.
+    """
+
+    def __init__(self, get_response):
+        options = get_options()
+        if not options["sample_rate"] and not options["token"]:
+            raise MiddlewareNotUsed("Profilage désactivé")
+        self.get_response = get_response
+        self.options = options
+        self.sampler = StackSampler(options["interval_ms"] / 1000, options["max_depth"])
+        self.store = ProfileStore(options["dir"], options["max_profiles"])
+
+    def __call__(self, request):
+        options = self.options
+        if request.path.startswith(options["exclude"]):
+            return self.get_response(request)
+        requested = HEADER in request.headers
+        if requested and not authorized(request, options):
+            requested = False
+        if not requested and not (options["sample_rate"] and random.random() < options["sample_rate"]):
+            return self.get_response(request)
+
+        thread_id = threading.get_ident()
+        started = time.perf_counter()
+        self.sampler.start(thread_id)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            stacks = self.sampler.stop(thread_id)
+            profile_id = self._save(request, response, stacks, started, "header" if requested else "sampled")
+            if response is not None and profile_id:
+                response["X-Profile-Id"] = profile_id
+
+    def _save(self, request, response, stacks, started, trigger):
+        profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        try:
+            self.store.save({
+                "id": profile_id,
+                "created_at": timezone.now().isoformat(),
+                "method": request.method,
+                "path": request.path,
+                "status": getattr(response, "status_code", 500),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "trigger": trigger,
+                "interval_ms": self.options["interval_ms"],
+                "samples": sum(stacks.values()),
+                "stacks": dict(stacks),
+            })
+        except OSError as e:
+            logger.error(f"Profil {profile_id} non enregistré : {e}")
+            return None
+        return profile_id
+
+
+def _authorized_store(request):
+    options = get_options()
+    if not authorized(request, options):
+        raise Http404
+    return ProfileStore(options["dir"], options["max_profiles"])
+
+
+def profile_list(request):
+    """GET /api/profiles/ : profils disponibles, du plus récent au plus ancien (sans les piles)"""
+    return JsonResponse({"profiles": _authorized_store(request).list()})
+
+
+def profile_download(request, profile_id):
+    """GET /api/profiles/<id>/?format=speedscope|collapsed|json"""
+    profile = _authorized_store(request).load(profile_id)
+    if profile is None:
+        raise Http404
+    fmt = request.GET.get("format", "speedscope")
+    if fmt == "collapsed":
+        response = HttpResponse(to_collapsed(profile), content_type="text/plain; charset=utf-8")
+        filename = f"{profile_id}.collapsed.txt"
+    elif fmt == "speedscope":
+        response = JsonResponse(to_speedscope(profile))
+        filename = f"{profile_id}.speedscope.json"
+    elif fmt == "json":
+        response = JsonResponse(profile)
+        filename = f"{profile_id}.json"
+    else:
+        return JsonResponse({"error": "Format inconnu (speedscope, collapsed ou json)."}, status=400)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
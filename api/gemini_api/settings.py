@@ -71,6 +71,8 @@ CORS_ALLOW_METHODS = ['GET', 'POST', 'OPTIONS']
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'gemini_api.profiling.ProfilingMiddleware',
+    'gemini_api.admission.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +81,43 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Profilage par échantillonnage de piles (gemini_api/profiling.py) : requêtes tirées
+# au sort ou portant l'en-tête « X-Profile: <jeton> ». Profils consultables via
+# /api/profiles/ (même en-tête). Sans taux ni jeton, le middleware est désactivé.
+PROFILING = {
+    'sample_rate': float(os.getenv('PROFILING_SAMPLE_RATE', '0')),
+    'token': os.getenv('PROFILING_TOKEN', ''),
+    'interval_ms': 5,
+    'max_profiles': 50,
+    'dir': BASE_DIR / 'profiles',
+}
+
+# Contrôle d'admission (gemini_api/admission.py) : concurrence max par endpoint,
+# file d'attente bornée, refus rapide 503 + Retry-After en cas de surcharge
+ADMISSION_CONTROL = {
+    'chat_stream': {
+        'path': '/api/chat/stream/',
+        'limit': 8, 'max_limit': 32, 'queue_size': 16, 'per_client': 2, 'max_wait': 5.0,
+    },
+    'chat': {
+        'path': '/api/chat/',
+        'limit': 8, 'max_limit': 32, 'queue_size': 16, 'per_client': 2, 'max_wait': 10.0,
+    },
+    # Connexions SSE longues : limite fixe élevée (pas d'adaptation à la latence)
+    'weather_subscribe': {
+        'path': '/api/weather/subscribe/',
+        'limit': 500, 'min_limit': 500, 'max_limit': 500, 'queue_size': 0, 'max_wait': 0,
+        'per_client': 4, 'per_address': 64,  # adresse seule : souvent un NAT opérateur partagé
+    },
+    'weather': {
+        'path': '/api/weather/',
+        'limit': 16, 'max_limit': 64, 'queue_size': 32, 'per_client': 4, 'max_wait': 5.0,
+    },
+}
+
+# Proxys inverses de confiance devant Django : 0 = X-Forwarded-For ignoré (falsifiable)
+ADMISSION_TRUSTED_PROXIES = int(os.getenv('ADMISSION_TRUSTED_PROXIES', '0'))
+
 ROOT_URLCONF = 'gemini_api.urls'
 
 TEMPLATES = [
@@ -146,6 +185,38 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Prétraitement des notes vocales (chat/audio.py) : mono 16 kHz, silences
+# de début/fin retirés, réencodage Opus. Nécessite ffmpeg (sinon audio transmis tel quel).
+AUDIO_PREPROCESSING = {
+    'enabled': os.getenv('AUDIO_PREPROCESSING', '1') == '1',
+    'workers': 2,
+    'max_seconds': 120,
+    'too_long': 'truncate',  # ou 'reject'
+}
+
+# Journal des échanges chat en écriture différée (chat/turn_log.py, table ChatTurn)
+CHAT_TURN_LOG = {
+    'enabled': True,
+    'queue_size': 10000,   # au-delà, les entrées sont abandonnées
+    'batch_size': 500,
+    'flush_interval': 2,   # secondes
+}
+
+# Interpolation spatiale des résultats météo en cache (weather/spatial.py) :
+# pas d'appel OpenWeather si assez de voisins frais dans le rayon
+WEATHER_INTERPOLATION = {
+    'radius_km': 15,
+    'min_neighbours': 3,
+    'max_age': 1800,  # secondes, aligné sur le cache météo
+}
+
+# Bundles météo hors ligne par région (weather/bundles.py), générés par
+# `manage.py build_weather_bundles`. En production, servis directement par le
+# serveur web : fichiers *.json.gz immuables (max-age=31536000, immutable),
+# manifest.json avec un cache court.
+WEATHER_BUNDLES_ROOT = BASE_DIR / 'bundles'
+WEATHER_BUNDLES_URL = '/bundles/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
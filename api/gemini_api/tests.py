@@ -0,0 +1,254 @@
+import time
+import tempfile
+from pathlib import Path
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from chat.sse import StreamBuffer
+
+from .admission import AdaptiveLimiter, AdmissionControlMiddleware, Rejected
+from .profiling import ProfileStore, ProfilingMiddleware, to_collapsed, to_speedscope
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+
+    def release_many(self, limiter, latencies, **kwargs):
+        for latency in latencies:
+            limiter.acquire("session:a")
+            limiter.release("session:a", latency, **kwargs)
+
+    def test_fast_responses_do_not_shrink_limit(self):
+        # 20 % de réponses instantanées (cache, 400...) et 80 % d'appels Gemini à 2 s
+        limiter = AdaptiveLimiter("test", limit=8, min_limit=2, per_client=100)
+        self.release_many(limiter, [0.005 if i % 5 == 0 else 2.0 for i in range(200)])
+        self.assertGreaterEqual(limiter.snapshot()["limit"], 8)
+
+    def test_client_errors_are_not_sampled(self):
+        limiter = AdaptiveLimiter("test", limit=8, per_client=100)
+        self.release_many(limiter, [0.2] * 50, sample=False)
+        self.release_many(limiter, [2.0] * 50)
+        self.assertGreaterEqual(limiter.snapshot()["limit"], 8)
+
+    def test_degraded_latency_shrinks_limit(self):
+        limiter = AdaptiveLimiter("test", limit=8, min_limit=2, per_client=100)
+        self.release_many(limiter, [1.0] * 100)
+        self.release_many(limiter, [5.0] * 20)
+        self.assertLess(limiter.snapshot()["limit"], 8)
+
+    def test_server_errors_shrink_limit(self):
+        limiter = AdaptiveLimiter("test", limit=8, min_limit=2, per_client=100)
+        self.release_many(limiter, [1.0] * 5, ok=False)
+        self.assertLess(limiter.snapshot()["limit"], 8)
+
+    def test_per_client_and_per_address_limits(self):
+        limiter = AdaptiveLimiter("test", limit=50, per_client=2, per_address=4)
+        for _ in range(2):
+            limiter.acquire("session:a")
+        with self.assertRaises(Rejected):
+            limiter.acquire("session:a")
+        for _ in range(4):
+            limiter.acquire("addr:10.0.0.1")
+        with self.assertRaises(Rejected):
+            limiter.acquire("addr:10.0.0.1")
+
+    def test_address_limit_applies_across_sessions(self):
+        limiter = AdaptiveLimiter("test", limit=50, per_client=2, per_address=3)
+        for session in ("a", "b", "c"):
+            limiter.acquire(f"session:{session}", address="addr:1.2.3.4")
+        with self.assertRaises(Rejected) as raised:
+            limiter.acquire("session:d", address="addr:1.2.3.4")
+        self.assertEqual(raised.exception.reason, "client_limit")
+        limiter.acquire("session:d", address="addr:5.6.7.8")
+
+        limiter.release("session:a", 0.1, address="addr:1.2.3.4")
+        limiter.acquire("session:d", address="addr:1.2.3.4")
+
+    def test_queue_full_rejects(self):
+        limiter = AdaptiveLimiter("test", limit=1, queue_size=0, per_client=10, per_address=10)
+        limiter.acquire("addr:1")
+        with self.assertRaises(Rejected) as raised:
+            limiter.acquire("addr:2")
+        self.assertEqual(raised.exception.reason, "queue_full")
+
+
+class ClientIdTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def client_id(self, request, proxies=0):
+        with override_settings(ADMISSION_TRUSTED_PROXIES=proxies):
+            middleware = AdmissionControlMiddleware(lambda request: None)
+        return middleware._client_id(request)
+
+    def test_session_from_json_body_and_form(self):
+        request = self.factory.post("/api/chat/", {"session_id": "abc"}, content_type="application/json")
+        self.assertEqual(self.client_id(request), "session:abc")
+        request = self.factory.post("/api/chat/", {"session_id": "xyz", "message": "salut"})
+        self.assertEqual(self.client_id(request), "session:xyz")
+
+    def test_default_session_falls_back_to_address(self):
+        request = self.factory.post(
+            "/api/chat/", {"session_id": "default"}, content_type="application/json", REMOTE_ADDR="1.2.3.4"
+        )
+        self.assertEqual(self.client_id(request), "addr:1.2.3.4")
+
+    def test_forwarded_for_ignored_without_trusted_proxy(self):
+        request = self.factory.get("/api/weather/", HTTP_X_FORWARDED_FOR="6.6.6.6", REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(self.client_id(request), "addr:10.0.0.2")
+
+    def test_forwarded_for_uses_rightmost_trusted_hop(self):
+        request = self.factory.get(
+            "/api/weather/", HTTP_X_FORWARDED_FOR="6.6.6.6, 41.1.1.1", REMOTE_ADDR="10.0.0.2"
+        )
+        self.assertEqual(self.client_id(request, proxies=1), "addr:41.1.1.1")
+
+
+ADMISSION = {"chat_stream": {"path": "/api/chat/stream/", "limit": 4, "per_client": 2}}
+
+
+@override_settings(ADMISSION_CONTROL=ADMISSION)
+class StreamAdmissionTests(SimpleTestCase):
+
+    def middleware(self, view):
+        middleware = AdmissionControlMiddleware(view)
+        return middleware, middleware.limiters[0][1]
+
+    def post(self, middleware):
+        return middleware(RequestFactory().post("/api/chat/stream/", {}, content_type="application/json"))
+
+    def test_slot_held_until_generation_finishes(self):
+        buffer = StreamBuffer("s")
+
+        def view(request):
+            response = StreamingHttpResponse(iter(["data: a\n\n"]), content_type="text/event-stream")
+            response.generation = buffer
+            return response
+
+        middleware, limiter = self.middleware(view)
+        response = self.post(middleware)
+        list(response.streaming_content)
+        response.close()  # client parti : la génération continue
+        self.assertEqual(limiter.snapshot()["in_flight"], 1)
+
+        time.sleep(0.06)
+        buffer.write("Bonjour")
+        time.sleep(0.5)
+        buffer.write(" à toi")
+        buffer.finish()
+        snapshot = limiter.snapshot()
+        self.assertEqual(snapshot["in_flight"], 0)
+        # Échantillon = délai avant premier jeton, pas durée totale du flux
+        self.assertLess(snapshot["avg_latency"], 0.3)
+
+    def test_failed_generation_shrinks_limit(self):
+        buffer = StreamBuffer("s")
+        buffer.status = 503
+        buffer.finish(None)
+
+        def view(request):
+            response = StreamingHttpResponse(iter([]), content_type="text/event-stream")
+            response.generation = buffer
+            return response
+
+        middleware, limiter = self.middleware(view)
+        self.post(middleware)
+        snapshot = limiter.snapshot()
+        self.assertEqual(snapshot["in_flight"], 0)
+        self.assertLess(snapshot["limit"], 4)
+
+    def test_plain_stream_is_not_sampled(self):
+        def view(request):
+            time.sleep(0.1)
+            return StreamingHttpResponse(iter(["data: a\n\n"]), content_type="text/event-stream")
+
+        middleware, limiter = self.middleware(view)
+        response = self.post(middleware)
+        list(response.streaming_content)
+        snapshot = limiter.snapshot()
+        self.assertEqual(snapshot["in_flight"], 0)
+        self.assertIsNone(snapshot["avg_latency"])
+
+    def test_sessions_share_address_limit(self):
+        middleware, limiter = self.middleware(lambda request: JsonResponse({}))
+        limiter.per_address = 1
+        limiter.acquire("session:a", address="addr:127.0.0.1")
+        request = RequestFactory().post(
+            "/api/chat/stream/", {"session_id": "b"}, content_type="application/json", REMOTE_ADDR="127.0.0.1"
+        )
+        self.assertEqual(middleware(request).status_code, 503)
+
+
+PROFILE = {
+    "id": "1760000000000-0123abcd",
+    "method": "POST",
+    "path": "/api/chat/",
+    "interval_ms": 5,
+    "stacks": {"views.py:post;views.py:_reply": 3, "views.py:post": 1},
+}
+
+
+class ProfilingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def options(self, **options):
+        return override_settings(PROFILING={"token": "secret", "dir": self.dir.name, **options})
+
+    def test_disabled_without_rate_or_token(self):
+        with override_settings(PROFILING={"sample_rate": 0, "token": ""}):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_wrong_token_is_not_profiled(self):
+        with self.options():
+            middleware = ProfilingMiddleware(lambda request: HttpResponse("ok"))
+        response = middleware(RequestFactory().get("/api/weather/", HTTP_X_PROFILE="faux"))
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(list(Path(self.dir.name).glob("*.json")), [])
+
+        response = middleware(RequestFactory().get("/api/weather/", HTTP_X_PROFILE="secret"))
+        profile = middleware.store.load(response["X-Profile-Id"])
+        self.assertEqual((profile["trigger"], profile["status"]), ("header", 200))
+
+    def test_store_keeps_latest_profiles(self):
+        store = ProfileStore(self.dir.name, max_profiles=2)
+        for index in range(3):
+            store.save({**PROFILE, "id": f"176000000000{index}-0123abcd"})
+        self.assertEqual([profile["id"] for profile in store.list()], [
+            "1760000000002-0123abcd", "1760000000001-0123abcd",
+        ])
+        self.assertNotIn("stacks", store.list()[0])
+        self.assertIsNone(store.load("1760000000000-0123abcd"))
+
+    def test_store_rejects_invalid_ids(self):
+        store = ProfileStore(self.dir.name, max_profiles=2)
+        store.save(PROFILE)
+        self.assertIsNotNone(store.load(PROFILE["id"]))
+        for profile_id in ("../settings", "1760000000000-0123ABCD", "abc"):
+            self.assertIsNone(store.load(profile_id))
+
+    def test_collapsed_and_speedscope_formats(self):
+        self.assertEqual(to_collapsed(PROFILE), "views.py:post 1\nviews.py:post;views.py:_reply 3\n")
+        speedscope = to_speedscope(PROFILE)
+        frames = [frame["name"] for frame in speedscope["shared"]["frames"]]
+        self.assertEqual(frames, ["views.py:post", "views.py:_reply"])
+        profile = speedscope["profiles"][0]
+        self.assertEqual(profile["samples"], [[0, 1], [0]])
+        self.assertEqual(profile["weights"], [15, 5])
+        self.assertEqual(profile["endValue"], 20)
+
+    def test_endpoints_require_token(self):
+        with self.options():
+            ProfileStore(self.dir.name, 50).save(PROFILE)
+            self.assertEqual(self.client.get("/api/profiles/").status_code, 404)
+            self.assertEqual(self.client.get("/api/profiles/", HTTP_X_PROFILE="faux").status_code, 404)
+            self.assertEqual(self.client.get(f"/api/profiles/{PROFILE['id']}/").status_code, 404)
+            response = self.client.get("/api/profiles/", HTTP_X_PROFILE="secret")
+            self.assertEqual([profile["id"] for profile in response.json()["profiles"]], [PROFILE["id"]])
+            response = self.client.get(f"/api/profiles/{PROFILE['id']}/?format=collapsed", HTTP_X_PROFILE="secret")
+            self.assertEqual(response.status_code, 200)
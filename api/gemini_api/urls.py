@@ -15,11 +15,20 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 # gemini_api/urls.py
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from .profiling import profile_download, profile_list
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/profiles/', profile_list),
+    path('api/profiles/<str:profile_id>/', profile_download),
     path('api/', include('chat.urls')),
     path('api/weather/', include('weather.urls')),
 ]
+
+# Développement uniquement : en production les bundles sont servis par le serveur web
+urlpatterns += static(settings.WEATHER_BUNDLES_URL, document_root=settings.WEATHER_BUNDLES_ROOT)
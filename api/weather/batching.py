@@ -0,0 +1,69 @@
+# weather/batching.py
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.results = []
+        self.error = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Regroupe les appels arrivant dans une courte fenêtre en un seul appel groupé.
+
+    Le premier appelant d'un lot en devient le « leader » : il attend WINDOW
+    secondes (ou que le lot atteigne MAX_SIZE), exécute `process(items)` puis
+    distribue les résultats ; les autres appelants attendent simplement le leur.
+    `process` renvoie une liste alignée sur `items` (None = pas de résultat pour
+    cet élément, l'appelant applique alors son propre fallback).
+    """
+
+    def __init__(self, process, window=0.25, max_size=10, timeout=90):
+        self.process = process
+        self.window = window
+        self.max_size = max_size
+        self.timeout = timeout
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        with self._lock:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_size:
+                self._batch = None  # lot complet : les suivants ouvrent un nouveau lot
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = None
+            self._run(batch)
+        elif not batch.done.wait(self.timeout):
+            raise TimeoutError("Lot non traité dans le délai imparti")
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index] if index < len(batch.results) else None
+
+    def _run(self, batch):
+        try:
+            logger.info(f"Traitement groupé de {len(batch.items)} élément(s)")
+            batch.results = list(self.process(batch.items))
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
@@ -0,0 +1,170 @@
+# weather/bundles.py
+
+import os
+import gzip
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .history import grid_cell
+from .models import ForecastSlot
+from .regions import REGIONS, in_country, nearest_region
+from .services import ALERT_BATCHER, WeatherService
+
+logger = logging.getLogger(__name__)
+
+
+class RegionBundleBuilder:
+    """
+    Pré-calcule un fichier statique compressé par région : météo actuelle,
+    prévisions 5 jours et alertes de chacune de ses cellules de grille.
+
+    Les fichiers sont nommés par empreinte de contenu (<region>.<sha256[:16]>.json.gz),
+    donc immuables : le serveur web peut les servir hors Django avec
+    « Cache-Control: public, max-age=31536000, immutable ». Seul manifest.json
+    (liste des versions courantes) doit avoir une courte durée de cache.
+
+    Cellules d'une région : ses localités de référence, plus les cellules
+    demandées récemment (historique) rattachées à la localité la plus proche.
+
+    La météo de toutes les cellules est récupérée en parallèle (FETCH_WORKERS
+    threads) : les cellules absentes du cache arrivent ensemble au micro-batcher
+    d'alertes et partagent un appel Gemini par lot au lieu d'un appel chacune.
+    """
+
+    FORMAT_VERSION = 1
+    KEEP_VERSIONS = 2          # versions conservées par région (clients en cours de téléchargement)
+    ACTIVE_CELLS_WINDOW = 24   # heures
+    FETCH_WORKERS = ALERT_BATCHER.max_size  # un lot d'alertes complet par vague
+
+    @classmethod
+    def build_all(cls, slugs=None):
+        root = Path(settings.WEATHER_BUNDLES_ROOT)
+        root.mkdir(parents=True, exist_ok=True)
+
+        manifest_path = root / "manifest.json"
+        manifest = {"format_version": cls.FORMAT_VERSION, "regions": {}}
+        if manifest_path.exists():
+            manifest["regions"] = json.loads(manifest_path.read_text()).get("regions", {})
+
+        active_cells = cls._active_cells()
+        points = {slug: cls._region_points(slug, active_cells.get(slug, [])) for slug in slugs or REGIONS}
+        weather = cls._fetch_all({cell: point for region in points.values() for cell, point in region.items()})
+
+        for slug, region_points in points.items():
+            try:
+                entry = cls.build_region(slug, root, region_points, weather)
+            except Exception as e:
+                logger.error(f"Bundle {slug} non reconstruit : {e}")
+                continue
+            if entry is not None:
+                manifest["regions"][slug] = entry
+
+        manifest["generated_at"] = timezone.now().isoformat()
+        cls._write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2).encode())
+        return manifest
+
+    @classmethod
+    def build_region(cls, slug, root, points, weather_by_cell):
+        """`points` : {cellule: (localité, lat, lon)} ; `weather_by_cell` : résultats de _fetch_all"""
+        name, _ = REGIONS[slug]
+
+        cells = []
+        for cell, (town, lat, lon) in sorted(points.items()):
+            weather = weather_by_cell.get(cell)
+            if weather is None:
+                logger.error(f"Bundle {slug} : cellule {cell} ignorée (météo indisponible)")
+                continue
+            cells.append({
+                "cell": cell,
+                "name": town,
+                "latitude": lat,
+                "longitude": lon,
+                "current": weather["current"],
+                "forecast": weather["forecast"],
+                "alerts": weather["alerts"],
+                "updated_at": weather["updated_at"],
+            })
+
+        if not cells:
+            logger.warning(f"Bundle {slug} : aucune cellule disponible, version précédente conservée")
+            return None
+
+        payload = json.dumps(
+            {"format_version": cls.FORMAT_VERSION, "region": slug, "name": name, "cells": cells},
+            ensure_ascii=False, separators=(",", ":"), sort_keys=True,
+        ).encode()
+        digest = hashlib.sha256(payload).hexdigest()
+        filename = f"{slug}.{digest[:16]}.json.gz"
+        path = root / filename
+
+        if not path.exists():
+            # mtime=0 : compression déterministe, même contenu => mêmes octets
+            cls._write_atomic(path, gzip.compress(payload, compresslevel=9, mtime=0))
+            cls._prune(root, slug)
+
+        return {
+            "name": name,
+            "url": f"{settings.WEATHER_BUNDLES_URL}{filename}",
+            "sha256": digest,
+            "size": path.stat().st_size,
+            "cells": len(cells),
+            "generated_at": timezone.now().isoformat(),
+        }
+
+    @staticmethod
+    def _region_points(slug, extra_cells=()):
+        _, towns = REGIONS[slug]
+        points = {grid_cell(lat, lon): (town, lat, lon) for town, lat, lon in towns}
+        for cell in extra_cells:
+            if cell not in points:
+                lat, lon = cell.split(":")
+                points[cell] = (None, float(lat), float(lon))
+        return points
+
+    @classmethod
+    def _fetch_all(cls, points):
+        """Météo de toutes les cellules en parallèle ; {cellule: résultat}, absente en cas d'échec"""
+        def fetch(item):
+            cell, (town, lat, lon) = item
+            try:
+                return cell, WeatherService.get_weather_for_location(lat, lon, town, allow_interpolation=False)
+            except Exception as e:
+                logger.error(f"Bundle : météo de la cellule {cell} indisponible ({e})")
+                return cell, None
+            finally:
+                connection.close()  # connexion ouverte par ce thread (historique)
+
+        with ThreadPoolExecutor(max_workers=cls.FETCH_WORKERS, thread_name_prefix="bundle-fetch") as pool:
+            return {cell: weather for cell, weather in pool.map(fetch, points.items()) if weather is not None}
+
+    @classmethod
+    def _active_cells(cls):
+        """Cellules demandées récemment, regroupées par région (hors du pays : ignorées)"""
+        since = timezone.now() - timedelta(hours=cls.ACTIVE_CELLS_WINDOW)
+        by_region = {}
+        for cell in ForecastSlot.objects.filter(issued_at__gte=since).values_list("cell", flat=True).distinct():
+            lat, lon = (float(value) for value in cell.split(":"))
+            if not in_country(lat, lon):
+                continue
+            by_region.setdefault(nearest_region(lat, lon), []).append(cell)
+        return by_region
+
+    @classmethod
+    def _prune(cls, root, slug):
+        versions = sorted(root.glob(f"{slug}.*.json.gz"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in versions[cls.KEEP_VERSIONS:]:
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
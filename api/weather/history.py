@@ -0,0 +1,264 @@
+# weather/history.py
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import ForecastSlot, ObservationDaily, WeatherDaily, WeatherObservation
+
+logger = logging.getLogger(__name__)
+
+HUMID_THRESHOLD = 85  # % : seuil de pression maladies fongiques
+SLOT_HOURS = 3
+OBSERVATION_AGGREGATES = (
+    "temp_min", "temp_max", "temp_avg", "humidity_avg", "pressure_avg", "wind_max", "rain_1h_max", "observations",
+)
+
+
+def grid_cell(latitude, longitude):
+    """Cellule de grille 0,1° (~11 km) : clé commune au cache et à l'historique"""
+    return f"{round(float(latitude), 1):.1f}:{round(float(longitude), 1):.1f}"
+
+
+def _utc(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+class WeatherHistory:
+    """
+    Série temporelle météo persistée (SQLite) par cellule de grille.
+
+    - observations actuelles et créneaux de prévision 3 h insérés en masse ;
+    - les créneaux et observations de plus de RAW_RETENTION_DAYS jours sont
+      agrégés par jour (WeatherDaily, ObservationDaily) puis supprimés ;
+    - requêtes par intervalle combinant données brutes et agrégats.
+    """
+
+    RAW_RETENTION_DAYS = 30
+    DAILY_RETENTION_DAYS = 730
+
+    @classmethod
+    def record_observation(cls, lat, lon, data):
+        """Enregistre la réponse brute de /weather"""
+        WeatherObservation.objects.bulk_create([
+            WeatherObservation(
+                cell=grid_cell(lat, lon),
+                observed_at=_utc(data["dt"]),
+                temperature=data["main"]["temp"],
+                humidity=data["main"]["humidity"],
+                pressure=data["main"]["pressure"],
+                wind_speed=round(data["wind"]["speed"] * 3.6, 1),
+                clouds=data["clouds"]["all"],
+                rain_1h=data.get("rain", {}).get("1h", 0),
+                icon=data["weather"][0]["icon"],
+            )
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def record_forecast(cls, lat, lon, items):
+        """Enregistre (ou remplace) les créneaux 3 h de la réponse brute de /forecast"""
+        cell = grid_cell(lat, lon)
+        issued_at = timezone.now()
+        slots = [
+            ForecastSlot(
+                cell=cell,
+                valid_at=_utc(item["dt"]),
+                issued_at=issued_at,
+                temperature=item["main"]["temp"],
+                temp_min=item["main"]["temp_min"],
+                temp_max=item["main"]["temp_max"],
+                humidity=item["main"]["humidity"],
+                pop=item.get("pop", 0),
+                rain_mm=item.get("rain", {}).get("3h", 0),
+                wind_speed=round(item["wind"]["speed"] * 3.6, 1),
+                clouds=item["clouds"]["all"],
+                icon=item["weather"][0]["icon"],
+                description=item["weather"][0]["description"][:64],
+            )
+            for item in items
+        ]
+        ForecastSlot.objects.bulk_create(
+            slots,
+            update_conflicts=True,
+            unique_fields=["cell", "valid_at"],
+            update_fields=[
+                "issued_at", "temperature", "temp_min", "temp_max", "humidity", "pop",
+                "rain_mm", "wind_speed", "clouds", "icon", "description",
+            ],
+        )
+
+    @classmethod
+    def rain_between(cls, cell, start, end):
+        """Cumul de pluie (mm) sur [start, end[ : créneaux bruts + agrégats journaliers"""
+        raw = ForecastSlot.objects.filter(cell=cell, valid_at__gte=start, valid_at__lt=end).aggregate(
+            rain=Sum("rain_mm"), slots=Count("id")
+        )
+        daily = WeatherDaily.objects.filter(cell=cell, date__gte=start.date(), date__lt=end.date()).aggregate(
+            rain=Sum("rain_mm"), slots=Sum("slots")
+        )
+        return {
+            "rain_mm": round((raw["rain"] or 0) + (daily["rain"] or 0), 1),
+            "slots": (raw["slots"] or 0) + (daily["slots"] or 0),
+        }
+
+    @classmethod
+    def humid_hours_between(cls, cell, start, end):
+        raw = ForecastSlot.objects.filter(
+            cell=cell, valid_at__gte=start, valid_at__lt=end, humidity__gt=HUMID_THRESHOLD
+        ).count() * SLOT_HOURS
+        daily = WeatherDaily.objects.filter(cell=cell, date__gte=start.date(), date__lt=end.date()).aggregate(
+            hours=Sum("humid_hours")
+        )["hours"] or 0
+        return raw + daily
+
+    @classmethod
+    def series(cls, cell, start, end=None):
+        """Créneaux 3 h bruts sur [start, end[ (end None : jusqu'au dernier connu), triés par heure"""
+        slots = ForecastSlot.objects.filter(cell=cell, valid_at__gte=start)
+        if end is not None:
+            slots = slots.filter(valid_at__lt=end)
+        return list(
+            slots.order_by("valid_at")
+            .values(
+                "valid_at", "issued_at", "temperature", "humidity", "pop", "rain_mm", "wind_speed", "clouds",
+                "icon", "description",
+            )
+        )
+
+    @classmethod
+    def observations_daily(cls, cell, start, end):
+        """
+        Observations mesurées par jour sur [start, end[, triées par date : agrégats
+        conservés pour les jours anciens, agrégation à la volée des observations brutes.
+        """
+        days = {
+            row["date"]: row
+            for row in ObservationDaily.objects.filter(cell=cell, date__gte=start.date(), date__lt=end.date())
+            .values("date", *OBSERVATION_AGGREGATES)
+        }
+        for row in cls._aggregate_observations(
+            WeatherObservation.objects.filter(cell=cell, observed_at__gte=start, observed_at__lt=end)
+        ):
+            days[row["date"]] = {"date": row["date"], **{field: row[field] for field in OBSERVATION_AGGREGATES}}
+        return [days[date] for date in sorted(days)]
+
+    @staticmethod
+    def _aggregate_observations(observations):
+        rows = observations.values("cell", "observed_at__date").annotate(
+            temp_min=Min("temperature"),
+            temp_max=Max("temperature"),
+            temp_avg=Avg("temperature"),
+            humidity_avg=Avg("humidity"),
+            pressure_avg=Avg("pressure"),
+            wind_max=Max("wind_speed"),
+            rain_1h_max=Max("rain_1h"),
+            observations=Count("id"),
+        )
+        return [
+            {
+                "cell": row["cell"],
+                "date": row["observed_at__date"],
+                "temp_min": row["temp_min"],
+                "temp_max": row["temp_max"],
+                "temp_avg": round(row["temp_avg"], 1),
+                "humidity_avg": round(row["humidity_avg"], 1),
+                "pressure_avg": round(row["pressure_avg"], 1),
+                "wind_max": row["wind_max"],
+                "rain_1h_max": row["rain_1h_max"] or 0,
+                "observations": row["observations"],
+            }
+            for row in rows
+        ]
+
+    @classmethod
+    def summary(cls, lat, lon, now=None):
+        """
+        Historique utile aux alertes : pluie sur 14 jours, heures humides sur 7 jours.
+        None si la couverture est insuffisante (moins de la moitié des créneaux connus).
+
+        Valeurs issues des créneaux de prévision passés (dernière prévision connue
+        pour chaque créneau), pas de mesures : OpenWeather /weather ne donne qu'un
+        cumul sur la dernière heure au moment de l'appel, d'où des observations
+        trop éparses pour un cumul fiable. Les clés et "source" le disent.
+        """
+        cell = grid_cell(lat, lon)
+        now = now or timezone.now()
+        rain = cls.rain_between(cell, now - timedelta(days=14), now)
+        expected_slots = 14 * 24 // SLOT_HOURS
+        if rain["slots"] < expected_slots // 2:
+            return None
+        return {
+            "source": "forecast",
+            "forecast_rain_14d_mm": rain["rain_mm"],
+            "forecast_humid_hours_7d": cls.humid_hours_between(cell, now - timedelta(days=7), now),
+            "coverage": round(min(rain["slots"] / expected_slots, 1), 2),
+        }
+
+    @classmethod
+    def downsample(cls, now=None):
+        """Agrège par jour les créneaux et observations de plus de RAW_RETENTION_DAYS jours puis les supprime"""
+        now = now or timezone.now()
+        cutoff = datetime.combine(
+            (now - timedelta(days=cls.RAW_RETENTION_DAYS)).date(), datetime.min.time(), tzinfo=dt_timezone.utc
+        )
+        old_slots = ForecastSlot.objects.filter(valid_at__lt=cutoff)
+        old_observations = WeatherObservation.objects.filter(observed_at__lt=cutoff)
+
+        rows = (
+            old_slots.values("cell", "valid_at__date")
+            .annotate(
+                temp_min=Min("temp_min"),
+                temp_max=Max("temp_max"),
+                temp_avg=Avg("temperature"),
+                humidity_avg=Avg("humidity"),
+                humid_slots=Count("id", filter=Q(humidity__gt=HUMID_THRESHOLD)),
+                rain_mm=Sum("rain_mm"),
+                slots=Count("id"),
+            )
+        )
+        daily = [
+            WeatherDaily(
+                cell=row["cell"],
+                date=row["valid_at__date"],
+                temp_min=row["temp_min"],
+                temp_max=row["temp_max"],
+                temp_avg=round(row["temp_avg"], 1),
+                humidity_avg=round(row["humidity_avg"], 1),
+                humid_hours=row["humid_slots"] * SLOT_HOURS,
+                rain_mm=round(row["rain_mm"] or 0, 1),
+                slots=row["slots"],
+            )
+            for row in rows
+        ]
+        observation_daily = [ObservationDaily(**row) for row in cls._aggregate_observations(old_observations)]
+
+        with transaction.atomic():
+            WeatherDaily.objects.bulk_create(
+                daily,
+                update_conflicts=True,
+                unique_fields=["cell", "date"],
+                update_fields=["temp_min", "temp_max", "temp_avg", "humidity_avg", "humid_hours", "rain_mm", "slots"],
+                batch_size=500,
+            )
+            ObservationDaily.objects.bulk_create(
+                observation_daily,
+                update_conflicts=True,
+                unique_fields=["cell", "date"],
+                update_fields=list(OBSERVATION_AGGREGATES),
+                batch_size=500,
+            )
+            deleted_slots, _ = old_slots.delete()
+            deleted_obs, _ = old_observations.delete()
+            daily_cutoff = (now - timedelta(days=cls.DAILY_RETENTION_DAYS)).date()
+            WeatherDaily.objects.filter(date__lt=daily_cutoff).delete()
+            ObservationDaily.objects.filter(date__lt=daily_cutoff).delete()
+
+        logger.info(
+            f"Historique météo sous-échantillonné : {len(daily)} jour(s) de prévision et "
+            f"{len(observation_daily)} jour(s) d'observation agrégé(s), "
+            f"{deleted_slots} créneau(x) et {deleted_obs} observation(s) supprimé(s)"
+        )
+        return len(daily)
@@ -0,0 +1,206 @@
+# weather/management/commands/alerts_benchmark.py
+
+import json
+import math
+import time
+import random
+
+from django.core.management.base import BaseCommand
+
+from weather.services import ALERT_STATS, WeatherService
+
+# Ancien format : prompt verbeux + exemple JSON, réponse en texte libre
+LEGACY_PROMPT = """
+Tu es un expert agronome spécialisé en agriculture tropicale en Côte d'Ivoire.
+Analyse les données météo ci-dessous et génère entre 0 et 6 alertes agricoles pertinentes pour les cultures principales : cacao, riz, manioc, café, igname, banane plantain.
+
+Priorités connues :
+- Cacao : très sensible à l'humidité élevée (>80%) + chaleur → risque black pod et maladies fongiques ; aussi sensible à la sécheresse et à l'harmattan.
+- Riz et manioc : risque d'inondation ou de sécheresse prolongée.
+- Général : stress thermique (>35°C), vents forts, conditions idéales pour travaux.
+
+Si aucune risque majeur, génère une alerte positive "conditions favorables".
+
+Utilise des emojis pertinents dans les titres et messages.
+
+Réponds EXCLUSIVEMENT en JSON valide avec cette structure :
+{{
+  "alerts": [
+    {{
+      "id": "unique_id_en_minuscules",
+      "severity": "high|medium|low",
+      "title": "Titre court avec emoji",
+      "message": "Message clair et engageant",
+      "recommendations": ["Conseil 1", "Conseil 2", "Conseil 3", "Conseil 4"]
+    }}
+  ]
+}}
+
+Données météo :
+Localisation : {location_name}
+Actuel : {current[temperature]}°C (ressenti {current[feels_like]}°C), humidité {current[humidity]}%, vent {current[wind_speed]} km/h
+Prévisions 5 jours :
+{forecast_summary}
+"""
+
+SAMPLE_ALERTS = [
+    {
+        "id": "black_pod",
+        "severity": "high",
+        "title": "🍫 Risque de pourriture brune",
+        "message": "Humidité élevée et chaleur : surveille tes cabosses.",
+        "recommendations": ["Récolte les cabosses malades", "Aère la plantation", "Traitement cuivre préventif"],
+    },
+    {
+        "id": "travaux",
+        "severity": "low",
+        "title": "🌱 Bonnes conditions de travail",
+        "message": "Temps favorable pour le désherbage.",
+        "recommendations": ["Désherbe le matin", "Prépare les pépinières"],
+    },
+]
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / 4)
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class _FakeResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = _Usage(estimate_tokens(prompt), estimate_tokens(text))
+
+
+class FakeAlertModel:
+    """
+    Faux modèle Gemini local : latence = BASE_LATENCY + PER_TOKEN_LATENCY * tokens
+    de sortie (multipliée par time_scale). En mode texte libre, la réponse est
+    entourée de texte et parfois tronquée, comme observé en production.
+    """
+
+    BASE_LATENCY = 0.6
+    PER_TOKEN_LATENCY = 0.008
+
+    def __init__(self, structured, malformed_rate=0.1, time_scale=0.01, seed=0):
+        self.structured = structured
+        self.malformed_rate = malformed_rate
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+
+    def generate_content(self, prompt, request_options=None):
+        if self.structured:
+            count = prompt.count("[loc_")
+            text = json.dumps({"locations": [
+                {"id": f"loc_{index}", "alerts": SAMPLE_ALERTS} for index in range(count)
+            ]}, ensure_ascii=False)
+        else:
+            body = json.dumps({"alerts": SAMPLE_ALERTS}, ensure_ascii=False, indent=2)
+            if self.random.random() < self.malformed_rate:
+                body = body[: len(body) // 2]
+            text = (
+                "Voici les alertes agricoles adaptées à la situation météo de ta zone :\n\n"
+                f"```json\n{body}\n```\n\n"
+                "N'hésite pas à me demander plus de détails sur une culture en particulier !"
+            )
+        time.sleep((self.BASE_LATENCY + self.PER_TOKEN_LATENCY * estimate_tokens(text)) * self.time_scale)
+        return _FakeResponse(text, prompt)
+
+
+class Command(BaseCommand):
+    help = "Compare la génération d'alertes texte libre (ancienne) et JSON contraint groupé, sur un faux modèle local"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--locations", type=int, default=30)
+        parser.add_argument("--batch-size", type=int, default=10)
+        parser.add_argument("--malformed-rate", type=float, default=0.1)
+        parser.add_argument("--time-scale", type=float, default=0.01,
+                            help="Facteur appliqué à la latence simulée (1 = temps réel)")
+
+    def handle(self, *args, **options):
+        items = [self._sample_item(index) for index in range(options["locations"])]
+
+        legacy = self._run_legacy(items, FakeAlertModel(False, options["malformed_rate"], options["time_scale"]))
+        structured = self._run_structured(
+            items, options["batch_size"], FakeAlertModel(True, time_scale=options["time_scale"])
+        )
+
+        self.stdout.write(f"{'':24}{'texte libre':>14}{'JSON contraint':>16}")
+        for label, key in (
+            ("Appels modèle", "calls"),
+            ("Échecs de parsing (%)", "failure_rate"),
+            ("Tokens entrée / loc.", "input_tokens"),
+            ("Tokens sortie / loc.", "output_tokens"),
+            ("Latence simulée (s)", "latency"),
+        ):
+            self.stdout.write(f"{label:24}{legacy[key]:>14}{structured[key]:>16}")
+        self.stdout.write(f"Statistiques service : {ALERT_STATS.snapshot()}")
+
+    def _run_legacy(self, items, model):
+        calls = failures = input_tokens = output_tokens = 0
+        latency = 0.0
+        for location_name, current, forecast in items:
+            forecast_summary = "\n".join(
+                f"- {day['day_name']} ({day['date']}): {day['temp_min']}–{day['temp_max']}°C, "
+                f"humidité {day['humidity']}%, pluie {day['rain_probability']}%, vent {day['wind_speed']} km/h"
+                for day in forecast
+            )
+            prompt = LEGACY_PROMPT.format(location_name=location_name, current=current, forecast_summary=forecast_summary)
+            started = time.perf_counter()
+            response = model.generate_content(prompt)
+            latency += time.perf_counter() - started
+            calls += 1
+            input_tokens += response.usage_metadata.prompt_token_count
+            output_tokens += response.usage_metadata.candidates_token_count
+            text = response.text
+            start, end = text.find("{"), text.rfind("}") + 1
+            try:
+                if start == -1 or end == 0:
+                    raise ValueError("Aucun JSON")
+                json.loads(text[start:end])
+            except ValueError:
+                failures += 1
+        return self._summary(len(items), calls, failures, input_tokens, output_tokens, latency)
+
+    def _run_structured(self, items, batch_size, model):
+        calls = failures = input_tokens = 0
+        latency = 0.0
+        tokens_before = ALERT_STATS.output_tokens
+        for offset in range(0, len(items), batch_size):
+            batch = items[offset:offset + batch_size]
+            started = time.perf_counter()
+            results = WeatherService._generate_alerts_batch(batch, model=model)
+            latency += time.perf_counter() - started
+            calls += 1
+            input_tokens += estimate_tokens("\n".join(
+                WeatherService._format_location_data(f"loc_{index}", *item) for index, item in enumerate(batch)
+            ))
+            failures += sum(1 for alerts in results if alerts is None)
+        output_tokens = ALERT_STATS.output_tokens - tokens_before
+        return self._summary(len(items), calls, failures, input_tokens, output_tokens, latency)
+
+    def _summary(self, count, calls, failures, input_tokens, output_tokens, latency):
+        return {
+            "calls": calls,
+            "failure_rate": round(100 * failures / count, 1),
+            "input_tokens": round(input_tokens / count),
+            "output_tokens": round(output_tokens / count),
+            "latency": round(latency, 3),
+        }
+
+    def _sample_item(self, index):
+        current = {"temperature": 29.5, "feels_like": 33.1, "humidity": 82, "wind_speed": 12.6, "rain_1h": 0}
+        forecast = [
+            {
+                "date": f"2026-10-{20 + day}", "day_name": "Lundi",
+                "temp_min": 23.4, "temp_max": 31.2, "humidity": 84,
+                "rain_probability": 60, "wind_speed": 14.4,
+            }
+            for day in range(5)
+        ]
+        return f"Parcelle {index}", current, forecast
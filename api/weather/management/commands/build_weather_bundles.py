@@ -0,0 +1,22 @@
+# weather/management/commands/build_weather_bundles.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from weather.bundles import RegionBundleBuilder
+from weather.regions import REGIONS
+
+
+class Command(BaseCommand):
+    help = "Construit les bundles météo hors ligne par région (à lancer périodiquement, ex. toutes les 30 min)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("regions", nargs="*", help="Régions à reconstruire (toutes par défaut)")
+
+    def handle(self, *args, **options):
+        unknown = [slug for slug in options["regions"] if slug not in REGIONS]
+        if unknown:
+            raise CommandError(f"Région(s) inconnue(s) : {', '.join(unknown)}")
+
+        manifest = RegionBundleBuilder.build_all(options["regions"] or None)
+        for slug, entry in sorted(manifest["regions"].items()):
+            self.stdout.write(f"{slug:20} {entry['cells']:3} cellule(s) {entry['size']:8} o  {entry['url']}")
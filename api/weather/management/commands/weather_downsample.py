@@ -0,0 +1,13 @@
+# weather/management/commands/weather_downsample.py
+
+from django.core.management.base import BaseCommand
+
+from weather.history import WeatherHistory
+
+
+class Command(BaseCommand):
+    help = "Agrège par jour l'historique météo ancien et purge les données brutes (à lancer quotidiennement)"
+
+    def handle(self, *args, **options):
+        days = WeatherHistory.downsample()
+        self.stdout.write(f"{days} jour(s) agrégé(s)")
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=16)),
+                ('valid_at', models.DateTimeField()),
+                ('issued_at', models.DateTimeField()),
+                ('temperature', models.FloatField()),
+                ('temp_min', models.FloatField()),
+                ('temp_max', models.FloatField()),
+                ('humidity', models.PositiveSmallIntegerField()),
+                ('pop', models.FloatField(default=0)),
+                ('rain_mm', models.FloatField(default=0)),
+                ('wind_speed', models.FloatField()),
+                ('clouds', models.PositiveSmallIntegerField()),
+                ('icon', models.CharField(max_length=8)),
+                ('description', models.CharField(max_length=64)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'valid_at'), name='weather_slot_cell_time')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WeatherDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=16)),
+                ('date', models.DateField()),
+                ('temp_min', models.FloatField()),
+                ('temp_max', models.FloatField()),
+                ('temp_avg', models.FloatField()),
+                ('humidity_avg', models.FloatField()),
+                ('humid_hours', models.PositiveSmallIntegerField(default=0)),
+                ('rain_mm', models.FloatField(default=0)),
+                ('slots', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'date'), name='weather_daily_cell_date')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WeatherObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=16)),
+                ('observed_at', models.DateTimeField()),
+                ('temperature', models.FloatField()),
+                ('humidity', models.PositiveSmallIntegerField()),
+                ('pressure', models.PositiveSmallIntegerField()),
+                ('wind_speed', models.FloatField()),
+                ('clouds', models.PositiveSmallIntegerField()),
+                ('rain_1h', models.FloatField(default=0)),
+                ('icon', models.CharField(max_length=8)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'observed_at'), name='weather_obs_cell_time')],
+            },
+        ),
+    ]
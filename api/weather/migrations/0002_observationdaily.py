@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObservationDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=16)),
+                ('date', models.DateField()),
+                ('temp_min', models.FloatField()),
+                ('temp_max', models.FloatField()),
+                ('temp_avg', models.FloatField()),
+                ('humidity_avg', models.FloatField()),
+                ('pressure_avg', models.FloatField()),
+                ('wind_max', models.FloatField()),
+                ('rain_1h_max', models.FloatField(default=0)),
+                ('observations', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'date'), name='weather_obs_daily_cell_date')],
+            },
+        ),
+    ]
@@ -1,3 +1,86 @@
 from django.db import models
 
-# Create your models here.
+
+class WeatherObservation(models.Model):
+    """Observation OpenWeather (météo actuelle) pour une cellule de grille 0,1°"""
+
+    cell = models.CharField(max_length=16)
+    observed_at = models.DateTimeField()
+    temperature = models.FloatField()
+    humidity = models.PositiveSmallIntegerField()
+    pressure = models.PositiveSmallIntegerField()
+    wind_speed = models.FloatField()      # km/h
+    clouds = models.PositiveSmallIntegerField()
+    rain_1h = models.FloatField(default=0)
+    icon = models.CharField(max_length=8)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cell", "observed_at"], name="weather_obs_cell_time"),
+        ]
+
+
+class ForecastSlot(models.Model):
+    """
+    Créneau de prévision 3 h. Un seul créneau par (cellule, heure) : la prévision
+    la plus récente remplace la précédente, les créneaux passés tiennent donc
+    lieu d'historique à 3 h.
+    """
+
+    cell = models.CharField(max_length=16)
+    valid_at = models.DateTimeField()
+    issued_at = models.DateTimeField()
+    temperature = models.FloatField()
+    temp_min = models.FloatField()
+    temp_max = models.FloatField()
+    humidity = models.PositiveSmallIntegerField()
+    pop = models.FloatField(default=0)    # probabilité de pluie 0-1
+    rain_mm = models.FloatField(default=0)  # cumul sur 3 h
+    wind_speed = models.FloatField()      # km/h
+    clouds = models.PositiveSmallIntegerField()
+    icon = models.CharField(max_length=8)
+    description = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cell", "valid_at"], name="weather_slot_cell_time"),
+        ]
+
+
+class WeatherDaily(models.Model):
+    """Agrégat journalier des créneaux anciens (sous-échantillonnage, voir weather/history.py)"""
+
+    cell = models.CharField(max_length=16)
+    date = models.DateField()
+    temp_min = models.FloatField()
+    temp_max = models.FloatField()
+    temp_avg = models.FloatField()
+    humidity_avg = models.FloatField()
+    humid_hours = models.PositiveSmallIntegerField(default=0)  # heures à humidité > 85 %
+    rain_mm = models.FloatField(default=0)
+    slots = models.PositiveSmallIntegerField()  # créneaux agrégés (8 = journée complète)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cell", "date"], name="weather_daily_cell_date"),
+        ]
+
+
+class ObservationDaily(models.Model):
+    """Agrégat journalier des observations anciennes (sous-échantillonnage, voir weather/history.py)"""
+
+    cell = models.CharField(max_length=16)
+    date = models.DateField()
+    temp_min = models.FloatField()
+    temp_max = models.FloatField()
+    temp_avg = models.FloatField()
+    humidity_avg = models.FloatField()
+    pressure_avg = models.FloatField()
+    wind_max = models.FloatField()        # km/h
+    rain_1h_max = models.FloatField(default=0)  # plus fort cumul horaire observé (pas un cumul journalier)
+    observations = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cell", "date"], name="weather_obs_daily_cell_date"),
+        ]
@@ -0,0 +1,59 @@
+# weather/regions.py
+
+# Régions administratives et districts autonomes de Côte d'Ivoire,
+# avec les localités de référence (chef-lieu en premier) : (nom, latitude, longitude)
+REGIONS = {
+    "abidjan": ("District d'Abidjan", [("Abidjan", 5.36, -4.01), ("Bingerville", 5.36, -3.89), ("Anyama", 5.49, -4.05)]),
+    "yamoussoukro": ("District de Yamoussoukro", [("Yamoussoukro", 6.82, -5.28), ("Attiégouakro", 6.77, -5.11)]),
+    "agneby-tiassa": ("Agnéby-Tiassa", [("Agboville", 5.93, -4.22), ("Tiassalé", 5.90, -4.83), ("Sikensi", 5.68, -4.57)]),
+    "bafing": ("Bafing", [("Touba", 8.28, -7.68), ("Koro", 8.55, -7.46)]),
+    "bagoue": ("Bagoué", [("Boundiali", 9.52, -6.49), ("Tengréla", 10.48, -6.41)]),
+    "belier": ("Bélier", [("Toumodi", 6.55, -5.02), ("Didiévi", 7.13, -4.90), ("Tiébissou", 7.16, -5.22)]),
+    "bere": ("Béré", [("Mankono", 8.06, -6.19), ("Kounahiri", 7.79, -5.84)]),
+    "bounkani": ("Bounkani", [("Bouna", 9.27, -3.00), ("Doropo", 9.81, -3.34)]),
+    "cavally": ("Cavally", [("Guiglo", 6.54, -7.49), ("Bloléquin", 6.57, -8.00), ("Toulépleu", 6.58, -8.41)]),
+    "folon": ("Folon", [("Minignan", 9.99, -7.84), ("Kaniasso", 9.82, -7.51)]),
+    "gbeke": ("Gbêkê", [("Bouaké", 7.69, -5.03), ("Béoumi", 7.67, -5.58), ("Sakassou", 7.45, -5.29)]),
+    "gbokle": ("Gbôklé", [("Sassandra", 4.95, -6.08), ("Fresco", 5.08, -5.57)]),
+    "goh": ("Gôh", [("Gagnoa", 6.13, -5.95), ("Oumé", 6.38, -5.42)]),
+    "gontougo": ("Gontougo", [("Bondoukou", 8.04, -2.80), ("Tanda", 7.80, -3.17)]),
+    "grands-ponts": ("Grands-Ponts", [("Dabou", 5.32, -4.38), ("Grand-Lahou", 5.14, -5.02), ("Jacqueville", 5.20, -4.42)]),
+    "guemon": ("Guémon", [("Duékoué", 6.74, -7.35), ("Bangolo", 7.01, -7.49)]),
+    "hambol": ("Hambol", [("Katiola", 8.14, -5.10), ("Dabakala", 8.36, -4.43), ("Niakaramandougou", 8.66, -5.29)]),
+    "haut-sassandra": ("Haut-Sassandra", [("Daloa", 6.88, -6.45), ("Issia", 6.49, -6.59), ("Vavoua", 7.38, -6.48)]),
+    "iffou": ("Iffou", [("Daoukro", 7.06, -3.96), ("M'Bahiakro", 7.45, -4.34)]),
+    "indenie-djuablin": ("Indénié-Djuablin", [("Abengourou", 6.73, -3.49), ("Agnibilékrou", 7.13, -3.20)]),
+    "kabadougou": ("Kabadougou", [("Odienné", 9.51, -7.56), ("Madinani", 9.61, -6.94)]),
+    "la-me": ("La Mé", [("Adzopé", 6.11, -3.86), ("Alépé", 5.50, -3.66), ("Akoupé", 6.38, -3.89)]),
+    "loh-djiboua": ("Lôh-Djiboua", [("Divo", 5.84, -5.36), ("Lakota", 5.85, -5.68)]),
+    "marahoue": ("Marahoué", [("Bouaflé", 6.99, -5.74), ("Zuénoula", 7.43, -6.05), ("Sinfra", 6.62, -5.91)]),
+    "moronou": ("Moronou", [("Bongouanou", 6.65, -4.20), ("Arrah", 6.67, -3.97)]),
+    "nawa": ("Nawa", [("Soubré", 5.79, -6.61), ("Méagui", 5.40, -6.56), ("Buyo", 6.25, -7.00)]),
+    "nzi": ("N'Zi", [("Dimbokro", 6.65, -4.71), ("Bocanda", 7.06, -4.50)]),
+    "poro": ("Poro", [("Korhogo", 9.46, -5.63), ("Sinématiali", 9.58, -5.38), ("M'Bengué", 10.00, -5.90)]),
+    "san-pedro": ("San-Pédro", [("San-Pédro", 4.75, -6.64), ("Tabou", 4.42, -7.35)]),
+    "sud-comoe": ("Sud-Comoé", [("Aboisso", 5.47, -3.21), ("Grand-Bassam", 5.21, -3.74), ("Adiaké", 5.29, -3.30)]),
+    "tchologo": ("Tchologo", [("Ferkessédougou", 9.59, -5.20), ("Ouangolodougou", 9.97, -5.15), ("Kong", 9.15, -4.61)]),
+    "tonkpi": ("Tonkpi", [("Man", 7.41, -7.55), ("Danané", 7.26, -8.15), ("Biankouma", 7.74, -7.61)]),
+    "worodougou": ("Worodougou", [("Séguéla", 7.96, -6.67), ("Kani", 8.48, -6.60)]),
+}
+
+# Rectangle englobant la Côte d'Ivoire (latitude min, max ; longitude min, max)
+COUNTRY_BOUNDS = (4.3, 10.8, -8.7, -2.4)
+
+
+def in_country(latitude, longitude):
+    """Point dans le rectangle englobant du pays (approximation, sans frontières exactes)"""
+    lat_min, lat_max, lon_min, lon_max = COUNTRY_BOUNDS
+    return lat_min <= latitude <= lat_max and lon_min <= longitude <= lon_max
+
+
+def nearest_region(latitude, longitude):
+    """Région de la localité de référence la plus proche (approximation sans polygones)"""
+    best, best_distance = None, None
+    for slug, (_, towns) in REGIONS.items():
+        for _, lat, lon in towns:
+            distance = (lat - latitude) ** 2 + (lon - longitude) ** 2
+            if best_distance is None or distance < best_distance:
+                best, best_distance = slug, distance
+    return best
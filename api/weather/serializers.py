@@ -0,0 +1,20 @@
+# weather/serializers.py
+
+from rest_framework import serializers
+
+
+class AlertSerializer(serializers.Serializer):
+    """Alerte agricole telle que renvoyée au client Flutter"""
+
+    id = serializers.CharField(max_length=64)
+    severity = serializers.ChoiceField(choices=["high", "medium", "low"])
+    title = serializers.CharField(max_length=120)
+    message = serializers.CharField()
+    recommendations = serializers.ListField(child=serializers.CharField(), max_length=6)
+
+
+class LocationAlertsSerializer(serializers.Serializer):
+    """Alertes générées par Gemini pour une localisation d'un lot"""
+
+    id = serializers.CharField()
+    alerts = serializers.ListField(child=AlertSerializer(), max_length=6)
@@ -2,43 +2,139 @@
 
 import requests
 import json
+import time
 import logging
+import threading
 from django.conf import settings
 from django.core.cache import cache
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .batching import MicroBatcher
+from .history import WeatherHistory, grid_cell
+from .slots import FORECAST_SLOTS, CellSeries
+from .spatial import SPATIAL_INDEX
+from .subscriptions import SubscriptionHub
+from .serializers import LocationAlertsSerializer
 
 logger = logging.getLogger(__name__)
 
+# Consignes fixes (instruction système) : le prompt ne contient plus que les données
+ALERTS_SYSTEM_INSTRUCTION = """
+Tu es un expert agronome en agriculture tropicale (Côte d'Ivoire).
+Pour chaque localisation [loc_N], génère 0 à 6 alertes agricoles pour : cacao, riz, manioc, café, igname, banane plantain.
+Priorités : cacao sensible à humidité >80% + chaleur (black pod, champignons), à la sécheresse et à l'harmattan ;
+riz et manioc : inondation ou sécheresse prolongée ; général : chaleur >35°C, vents forts, conditions idéales pour travaux.
+Sans risque majeur : une alerte "conditions favorables". Emojis dans titres et messages. 4 recommandations courtes max.
+Format des données : date min-max°C h=humidité pluie=probabilité v=vent km/h.
+"""
+
+_ALERT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "severity": {"type": "string", "format": "enum", "enum": ["high", "medium", "low"]},
+        "title": {"type": "string"},
+        "message": {"type": "string"},
+        "recommendations": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["id", "severity", "title", "message", "recommendations"],
+}
+
+ALERTS_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "locations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "alerts": {"type": "array", "items": _ALERT_SCHEMA},
+                },
+                "required": ["id", "alerts"],
+            },
+        },
+    },
+    "required": ["locations"],
+}
+
+
+class AlertGenerationStats:
+    """Compteurs de génération d'alertes : taux d'échec de parsing, tokens et latence"""
+
+    def __init__(self):
+        self.calls = 0
+        self.locations = 0
+        self.parse_failures = 0
+        self.output_tokens = 0
+        self.latency = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, locations, failures, output_tokens, latency):
+        with self._lock:
+            self.calls += 1
+            self.locations += locations
+            self.parse_failures += failures
+            self.output_tokens += output_tokens
+            self.latency += latency
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "locations": self.locations,
+                "parse_failure_rate": round(self.parse_failures / self.locations, 3) if self.locations else 0.0,
+                "avg_output_tokens_per_location": round(self.output_tokens / self.locations, 1) if self.locations else 0.0,
+                "avg_latency": round(self.latency / self.calls, 3) if self.calls else 0.0,
+            }
+
+
+ALERT_STATS = AlertGenerationStats()
+
 
 class WeatherService:
     """Service de gestion de la météo agricole"""
 
     OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
     CACHE_TIMEOUT = 1800  # 30 minutes
+    INTERPOLATED_CACHE_TIMEOUT = 300  # résultat interpolé : réévalué plus souvent
 
     @classmethod
-    def get_weather_for_location(cls, latitude, longitude, location_name=None):
+    def get_weather_for_location(cls, latitude, longitude, location_name=None, allow_interpolation=True):
         """
-        Récupère la météo complète pour une localisation
+        Récupère la météo complète pour une localisation.
+        Si assez de résultats frais existent autour du point, ils sont interpolés
+        (résultat marqué "interpolated") au lieu d'interroger OpenWeather.
         """
         cache_key = f"weather_{latitude}_{longitude}"
         cached_data = cache.get(cache_key)
 
-        if cached_data:
+        if cached_data and (allow_interpolation or not cached_data.get("interpolated")):
             logger.info(f"Cache hit pour {cache_key}")
             return cached_data
 
+        if allow_interpolation:
+            interpolated = SPATIAL_INDEX.interpolate(latitude, longitude, location_name)
+            if interpolated is not None:
+                logger.info(f"Météo interpolée pour {cache_key} ({interpolated['interpolation']['neighbours']} voisin(s))")
+                cache.set(cache_key, interpolated, cls.INTERPOLATED_CACHE_TIMEOUT)
+                return interpolated
+
         try:
             # Récupérer le forecast d'abord pour pouvoir enrichir le current
             forecast = cls._get_forecast(latitude, longitude)
 
             current_weather = cls._get_current_weather(latitude, longitude, forecast=forecast)
 
+            # Cumuls des prévisions passées (pluie 14 j, heures humides 7 j) pour les alertes sécheresse / maladies
+            history = cls._get_history_summary(latitude, longitude)
+
             # Génération des alertes via Gemini (avec fallback)
             alerts = cls._generate_agricultural_alerts_with_gemini(
                 location_name or "Votre position",
                 current_weather,
-                forecast
+                forecast,
+                history
             )
 
             result = {
@@ -50,10 +146,15 @@ class WeatherService:
                 "current": current_weather,
                 "forecast": forecast,
                 "alerts": alerts,
-                "updated_at": datetime.now().isoformat()
+                "alerts_source": "location",
+                "history": history,
+                "history_source": "location",
+                "updated_at": datetime.now().isoformat(),
+                "interpolated": False
             }
 
             cache.set(cache_key, result, cls.CACHE_TIMEOUT)
+            SPATIAL_INDEX.add(latitude, longitude, result)
             logger.info(f"Données météo mises en cache pour {cache_key}")
 
             return result
@@ -62,6 +163,52 @@ class WeatherService:
             logger.error(f"Erreur récupération météo: {e}", exc_info=True)
             raise
 
+    @classmethod
+    def get_forecast_slots(cls, latitude, longitude, start=None, hours=24):
+        """
+        Prévisions brutes 3 h sur [start, start + hours[ (start : timestamp Unix,
+        par défaut le créneau en cours). Servies depuis le cache en colonnes, alimenté
+        par le même appel /forecast que la météo quotidienne : pas d'appel supplémentaire.
+        """
+        cell = grid_cell(latitude, longitude)
+        start = int(start if start is not None else time.time() - 3 * 3600)
+        end = start + int(hours * 3600)
+
+        series = FORECAST_SLOTS.get(cell)
+        if series is None or time.time() - series.updated_at > cls.CACHE_TIMEOUT:
+            # Rafraîchit via le chemin quotidien (et son cache) : un seul fetch partagé.
+            # Pas d'interpolation ici : la série 3 h vient du /forecast de cette cellule.
+            cls.get_weather_for_location(latitude, longitude, allow_interpolation=False)
+            series = FORECAST_SLOTS.get(cell)
+
+        if series is None:
+            # Météo quotidienne encore en cache mais cellule évincée du cache en colonnes
+            # (MAX_CELLS) : relecture de tout l'horizon persisté de la cellule, pas seulement
+            # de la fenêtre demandée (la série mise en cache vaut pour toute requête). Rien de caché si vide.
+            since = datetime.fromtimestamp(time.time() - CellSeries.RETENTION, tz=dt_timezone.utc)
+            FORECAST_SLOTS.merge_rows(cell, WeatherHistory.series(cell, since))
+
+        slots = [
+            {
+                "time": datetime.fromtimestamp(slot["dt"], tz=dt_timezone.utc).isoformat(),
+                "hour": datetime.fromtimestamp(slot["dt"]).strftime("%H:%M"),
+                "temperature": round(slot["temperature"], 1),
+                "humidity": round(slot["humidity"]),
+                "rain_probability": round(slot["pop"] * 100),
+                "rain_mm": round(slot["rain_mm"], 1),
+                "wind_speed": round(slot["wind_speed"], 1),
+                "clouds": round(slot["clouds"]),
+                "description": slot["description"].capitalize(),
+                "icon": slot["icon"],
+            }
+            for slot in FORECAST_SLOTS.window(cell, start, end)
+        ]
+
+        return {
+            "location": {"latitude": latitude, "longitude": longitude, "cell": cell},
+            "slots": slots,
+        }
+
     @classmethod
     def _get_current_weather(cls, lat, lon, forecast=None):
         """Récupère la météo actuelle via OpenWeatherMap"""
@@ -79,6 +226,7 @@ class WeatherService:
         response = requests.get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
+        cls._record_history(WeatherHistory.record_observation, lat, lon, data)
 
         # Utilisation des vraies min/max du jour depuis le forecast si disponible
         today_min = forecast[0]["temp_min"] if forecast else data["main"]["temp_min"]
@@ -121,6 +269,8 @@ class WeatherService:
         response = requests.get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
+        cls._record_history(WeatherHistory.record_forecast, lat, lon, data["list"])
+        FORECAST_SLOTS.merge_items(lat, lon, data["list"])
 
         daily_data = {}
 
@@ -185,74 +335,110 @@ class WeatherService:
         return daily_forecasts
 
     @classmethod
-    def _generate_agricultural_alerts_with_gemini(cls, location_name, current, forecast):
-        """Génère des alertes via Gemini avec fallback sur version statique"""
-        forecast_summary = "\n".join([
-            f"- {day['day_name']} ({day['date']}): {day['temp_min']}–{day['temp_max']}°C, "
-            f"humidité {day['humidity']}%, pluie {day['rain_probability']}%, vent {day['wind_speed']} km/h"
-            for day in forecast
-        ])
-
-        prompt = f"""
-Tu es un expert agronome spécialisé en agriculture tropicale en Côte d'Ivoire.
-Analyse les données météo ci-dessous et génère entre 0 et 6 alertes agricoles pertinentes pour les cultures principales : cacao, riz, manioc, café, igname, banane plantain.
-
-Priorités connues :
-- Cacao : très sensible à l'humidité élevée (>80%) + chaleur → risque black pod et maladies fongiques ; aussi sensible à la sécheresse et à l'harmattan.
-- Riz et manioc : risque d'inondation ou de sécheresse prolongée.
-- Général : stress thermique (>35°C), vents forts, conditions idéales pour travaux.
-
-Si aucune risque majeur, génère une alerte positive "conditions favorables".
-
-Utilise des emojis pertinents dans les titres et messages.
-
-Réponds EXCLUSIVEMENT en JSON valide avec cette structure :
-{{
-  "alerts": [
-    {{
-      "id": "unique_id_en_minuscules",
-      "severity": "high|medium|low",
-      "title": "Titre court avec emoji",
-      "message": "Message clair et engageant",
-      "recommendations": ["Conseil 1", "Conseil 2", "Conseil 3", "Conseil 4"]
-    }}
-  ]
-}}
-
-Données météo :
-Localisation : {location_name}
-Actuel : {current['temperature']}°C (ressenti {current['feels_like']}°C), humidité {current['humidity']}%, vent {current['wind_speed']} km/h
-Prévisions 5 jours :
-{forecast_summary}
-"""
+    def _record_history(cls, record, *args):
+        """Persiste les données brutes ; un échec ne doit jamais bloquer la météo"""
+        try:
+            record(*args)
+        except Exception as e:
+            logger.error(f"Échec enregistrement historique météo : {e}")
+
+    @classmethod
+    def _get_history_summary(cls, lat, lon):
+        try:
+            return WeatherHistory.summary(lat, lon)
+        except Exception as e:
+            logger.error(f"Historique météo indisponible : {e}")
+            return None
 
+    @classmethod
+    def _generate_agricultural_alerts_with_gemini(cls, location_name, current, forecast, history=None):
+        """Génère des alertes via Gemini (appels regroupés) avec fallback sur version statique"""
         try:
-            chat_response = requests.post(
-                "http://localhost:8000/api/chat/",  # À adapter si URL différente en prod
-                json={"message": prompt},
-                timeout=30
-            )
-            chat_response.raise_for_status()
-            gemini_output = chat_response.json().get("response", "")  # Adaptez selon ta structure de réponse
-
-            # Extraction du JSON (Gemini peut ajouter du texte autour)
-            start = gemini_output.find("{")
-            end = gemini_output.rfind("}") + 1
-            if start == -1 or end == 0:
-                raise ValueError("Aucun JSON trouvé dans la réponse Gemini")
-            json_str = gemini_output[start:end]
-            alerts_data = json.loads(json_str)
-            alerts = alerts_data.get("alerts", [])
-
-            logger.info(f"Alertes générées par Gemini : {len(alerts)} alerte(s)")
+            alerts = ALERT_BATCHER.submit((location_name, current, forecast, history))
+            if alerts is None:
+                raise ValueError(f"Aucune alerte renvoyée pour {location_name}")
             return alerts
 
         except Exception as e:
             logger.error(f"Échec génération alertes Gemini : {e}. Utilisation du fallback statique.")
-            return cls._generate_agricultural_alerts_static(current, forecast)
+            return cls._generate_agricultural_alerts_static(current, forecast, history)
+
+    @classmethod
+    def _generate_alerts_batch(cls, items, model=None):
+        """
+        Un seul appel Gemini pour plusieurs localisations, en sortie JSON contrainte
+        par ALERTS_RESPONSE_SCHEMA. items : liste de (location_name, current, forecast[, history]) ;
+        renvoie une liste d'alertes alignée sur items (None si la localisation
+        manque ou est invalide : fallback statique pour elle seule).
+        """
+        model = model or cls._alerts_model()
+        prompt = "\n".join(
+            cls._format_location_data(f"loc_{index}", *item) for index, item in enumerate(items)
+        )
+
+        started = time.perf_counter()
+        response = model.generate_content(prompt, request_options={"timeout": 30 + 5 * len(items)})
+        latency = time.perf_counter() - started
+        usage = getattr(response, "usage_metadata", None)
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+
+        try:
+            locations = json.loads(response.text).get("locations", [])
+        except (ValueError, AttributeError) as e:
+            ALERT_STATS.record(len(items), len(items), output_tokens, latency)
+            raise ValueError(f"Réponse Gemini non conforme au schéma : {e}")
+
+        by_id = {}
+        for location in locations:
+            serializer = LocationAlertsSerializer(data=location)
+            if serializer.is_valid():
+                by_id[serializer.validated_data["id"]] = [dict(alert) for alert in serializer.validated_data["alerts"]]
+            else:
+                logger.warning(f"Alertes invalides ignorées : {serializer.errors}")
+        results = [by_id.get(f"loc_{index}") for index in range(len(items))]
+
+        failures = sum(1 for alerts in results if alerts is None)
+        ALERT_STATS.record(len(items), failures, output_tokens, latency)
+        logger.info(
+            f"Alertes générées par Gemini : {len(items) - failures}/{len(items)} localisation(s) en un appel "
+            f"({output_tokens} tokens, {latency:.2f} s)"
+        )
+        return results
 
     @classmethod
-    def _generate_agricultural_alerts_static(cls, current, forecast):
+    def _alerts_model(cls):
+        """Modèle Gemini partagé, configuré pour une sortie JSON suivant le schéma des alertes"""
+        from chat.gemini import get_model
+
+        return get_model(
+            ALERTS_SYSTEM_INSTRUCTION,
+            generation_config={
+                "response_mime_type": "application/json",
+                "response_schema": ALERTS_RESPONSE_SCHEMA,
+                "temperature": 0.4,
+            },
+        )
+
+    @classmethod
+    def _format_location_data(cls, location_id, location_name, current, forecast, history=None):
+        """Données compactes d'une localisation : une ligne pour l'actuel, une par jour"""
+        days = "; ".join(
+            f"{day['date']} {day['temp_min']}-{day['temp_max']}°C h{day['humidity']}% "
+            f"pluie{day['rain_probability']}% v{day['wind_speed']}"
+            for day in forecast
+        )
+        return (
+            f"[{location_id}] {location_name} | actuel {current['temperature']}°C "
+            f"(ressenti {current['feels_like']}) h{current['humidity']}% v{current['wind_speed']} km/h | {days}"
+            + (
+                f" | prévisions passées (pas des mesures) : pluie prévue 14j {history['forecast_rain_14d_mm']} mm,"
+                f" {history['forecast_humid_hours_7d']} h humides prévues sur 7j"
+                if history else ""
+            )
+        )
+
+    @classmethod
+    def _generate_agricultural_alerts_static(cls, current, forecast, history=None):
         """Fallback : version statique originale (au cas où Gemini échoue)"""
         alerts = []
 
@@ -272,12 +458,16 @@ Prévisions 5 jours :
             })
 
         dry_days = [day for day in forecast if day["rain_probability"] < 20]
-        if len(dry_days) >= 3 and current["rain_1h"] == 0:
+        dry_history = history is not None and history["forecast_rain_14d_mm"] < 5
+        if (len(dry_days) >= 3 or (dry_history and len(dry_days) >= 2)) and current["rain_1h"] == 0:
+            message = f"Pas de pluie significative prévue sur {len(dry_days)} jours."
+            if dry_history:
+                message += f" Les prévisions des 14 derniers jours n'annonçaient que {history['forecast_rain_14d_mm']} mm."
             alerts.append({
                 "id": "drought",
-                "severity": "medium",
+                "severity": "high" if dry_history else "medium",
                 "title": "Période sèche prolongée",
-                "message": f"Pas de pluie significative prévue sur {len(dry_days)} jours.",
+                "message": message,
                 "recommendations": [
                     "Prévoir l'irrigation si possible",
                     "Pailler le sol pour conserver l'humidité",
@@ -317,12 +507,16 @@ Prévisions 5 jours :
             })
 
         humid_days = [day for day in forecast if day["humidity"] > 85]
-        if len(humid_days) >= 2 or current["humidity"] > 85:
+        humid_history = history is not None and history["forecast_humid_hours_7d"] >= 48
+        if len(humid_days) >= 2 or current["humidity"] > 85 or humid_history:
+            message = "Conditions favorables au développement de champignons."
+            if humid_history:
+                message += f" Environ {history['forecast_humid_hours_7d']} h d'humidité élevée prévues ces 7 derniers jours."
             alerts.append({
                 "id": "high_humidity",
-                "severity": "medium",
+                "severity": "high" if humid_history else "medium",
                 "title": "Humidité élevée - Risque de maladies",
-                "message": "Conditions favorables au développement de champignons.",
+                "message": message,
                 "recommendations": [
                     "Surveiller l'apparition de maladies fongiques",
                     "Espacer les plants pour améliorer l'aération",
@@ -389,4 +583,14 @@ Prévisions 5 jours :
         lon = geo_data[0]["lon"]
         location_name = geo_data[0]["name"]
 
-        return cls.get_weather_for_location(lat, lon, location_name)
\ No newline at end of file
+        return cls.get_weather_for_location(lat, lon, location_name)
+
+
+# Regroupe les générations d'alertes simultanées (rafraîchissement du cache) en un appel Gemini
+ALERT_BATCHER = MicroBatcher(WeatherService._generate_alerts_batch, window=0.25, max_size=10)
+
+# Abonnements SSE aux alertes : un rafraîchissement par cellule, quel que soit le nombre d'abonnés
+ALERT_SUBSCRIPTIONS = SubscriptionHub(
+    lambda latitude, longitude: WeatherService.get_weather_for_location(latitude, longitude)["alerts"],
+    workers=ALERT_BATCHER.max_size,
+)
@@ -0,0 +1,136 @@
+# weather/slots.py
+
+import time
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from .history import grid_cell
+
+# Colonnes numériques (float32) d'une série 3 h ; icônes et descriptions à part
+NUMERIC_COLUMNS = ("temperature", "humidity", "pop", "rain_mm", "wind_speed", "clouds")
+
+
+class CellSeries:
+    """
+    Série 3 h d'une cellule de grille, stockée en colonnes (array) triées par heure.
+    Une prévision plus récente remplace la plage qu'elle couvre ; les créneaux
+    passés sont conservés RETENTION secondes.
+    """
+
+    RETENTION = 24 * 3600
+
+    def __init__(self):
+        self.times = array("q")
+        self.columns = {name: array("f") for name in NUMERIC_COLUMNS}
+        self.icons = []
+        self.descriptions = []
+        self.updated_at = 0.0
+
+    def merge(self, times, values, icons, descriptions, updated_at=None):
+        """
+        times triés (non vide) ; values : {colonne: [valeurs]} alignées sur times.
+        updated_at : date d'émission de ces prévisions (maintenant par défaut).
+        """
+        lo = bisect_left(self.times, times[0])
+        hi = bisect_right(self.times, times[-1])
+        self.times[lo:hi] = array("q", times)
+        for name in NUMERIC_COLUMNS:
+            self.columns[name][lo:hi] = array("f", values[name])
+        self.icons[lo:hi] = icons
+        self.descriptions[lo:hi] = descriptions
+        self.updated_at = max(self.updated_at, updated_at if updated_at is not None else time.time())
+        self._trim(time.time() - self.RETENTION)
+
+    def window(self, start, end):
+        """Créneaux dont l'heure est dans [start, end[ (timestamps Unix)"""
+        lo = bisect_left(self.times, start)
+        hi = bisect_left(self.times, end)
+        return [
+            {
+                "dt": self.times[i],
+                **{name: self.columns[name][i] for name in NUMERIC_COLUMNS},
+                "icon": self.icons[i],
+                "description": self.descriptions[i],
+            }
+            for i in range(lo, hi)
+        ]
+
+    def _trim(self, before):
+        cut = bisect_left(self.times, before)
+        if cut:
+            del self.times[:cut]
+            for column in self.columns.values():
+                del column[:cut]
+            del self.icons[:cut]
+            del self.descriptions[:cut]
+
+
+class ForecastSlotCache:
+    """Cache processus des séries 3 h par cellule (LRU borné)"""
+
+    MAX_CELLS = 2000
+
+    def __init__(self):
+        self._cells = OrderedDict()
+        self._lock = threading.Lock()
+
+    def merge_items(self, lat, lon, items):
+        """Fusionne la liste brute de /forecast (réutilise le fetch du quotidien)"""
+        items = sorted(items, key=lambda item: item["dt"])
+        self._merge(
+            grid_cell(lat, lon),
+            [item["dt"] for item in items],
+            {
+                "temperature": [item["main"]["temp"] for item in items],
+                "humidity": [item["main"]["humidity"] for item in items],
+                "pop": [item.get("pop", 0) for item in items],
+                "rain_mm": [item.get("rain", {}).get("3h", 0) for item in items],
+                "wind_speed": [item["wind"]["speed"] * 3.6 for item in items],
+                "clouds": [item["clouds"]["all"] for item in items],
+            },
+            [item["weather"][0]["icon"] for item in items],
+            [item["weather"][0]["description"] for item in items],
+        )
+
+    def merge_rows(self, cell, rows):
+        """
+        Fusionne des créneaux lus dans l'historique (ForecastSlot.values()).
+        La fraîcheur de la série est celle de leur émission, pas l'heure de lecture.
+        """
+        self._merge(
+            cell,
+            [int(row["valid_at"].timestamp()) for row in rows],
+            {name: [row[name] for row in rows] for name in NUMERIC_COLUMNS},
+            [row["icon"] for row in rows],
+            [row["description"] for row in rows],
+            updated_at=max((row["issued_at"].timestamp() for row in rows), default=None),
+        )
+
+    def get(self, cell):
+        with self._lock:
+            series = self._cells.get(cell)
+            if series is not None:
+                self._cells.move_to_end(cell)
+            return series
+
+    def window(self, cell, start, end):
+        with self._lock:
+            series = self._cells.get(cell)
+            return series.window(start, end) if series is not None else []
+
+    def _merge(self, cell, times, values, icons, descriptions, updated_at=None):
+        if not times:
+            return  # rien à fusionner : ne pas créer de série vide réputée fraîche
+        with self._lock:
+            series = self._cells.get(cell)
+            if series is None:
+                series = self._cells[cell] = CellSeries()
+            self._cells.move_to_end(cell)
+            series.merge(times, values, icons, descriptions, updated_at)
+            while len(self._cells) > self.MAX_CELLS:
+                self._cells.popitem(last=False)
+
+
+FORECAST_SLOTS = ForecastSlotCache()
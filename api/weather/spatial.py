@@ -0,0 +1,179 @@
+# weather/spatial.py
+
+import math
+import time
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0
+
+CURRENT_NUMERIC = (
+    "temperature", "feels_like", "temp_min", "temp_max", "humidity", "pressure",
+    "wind_speed", "clouds", "visibility", "rain_1h", "rain_3h",
+)
+FORECAST_NUMERIC = (
+    "temp", "temp_min", "temp_max", "humidity", "rain_probability", "rain_mm", "wind_speed", "clouds",
+)
+# Champs entiers dans les réponses OpenWeather agrégées
+INTEGER_FIELDS = {"humidity", "pressure", "clouds", "rain_probability"}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _idw(values, weights, integer=False):
+    value = sum(v * w for v, w in zip(values, weights)) / sum(weights)
+    return round(value) if integer else round(value, 1)
+
+
+def _weighted_mode(values, weights):
+    scores = Counter()
+    for value, weight in zip(values, weights):
+        scores[value] += weight
+    return scores.most_common(1)[0][0]
+
+
+class SpatialWeatherIndex:
+    """
+    Index en grille des résultats météo frais (un seau par BUCKET_DEGREES).
+
+    Pour une coordonnée nouvelle, si au moins `min_neighbours` résultats de moins
+    de `max_age` secondes existent dans un rayon de `radius_km`, les valeurs sont
+    interpolées par pondération inverse de la distance (IDW) ; icône et
+    description prennent la valeur dominante pondérée. Sinon l'appelant interroge
+    OpenWeather. Les alertes et l'historique sont ceux du plus proche voisin, tels
+    quels : "alerts_source" et "history_source" valent alors "nearest".
+    Réglages : settings.WEATHER_INTERPOLATION.
+    """
+
+    BUCKET_DEGREES = 0.25
+    POWER = 2  # exposant IDW
+    PURGE_EVERY = 500
+
+    def __init__(self):
+        options = getattr(settings, "WEATHER_INTERPOLATION", {})
+        self.radius_km = options.get("radius_km", 15)
+        self.min_neighbours = options.get("min_neighbours", 3)
+        self.max_age = options.get("max_age", 1800)
+        self._buckets = {}  # (i, j) -> {(lat, lon): (résultat, stocké_à)}
+        self._adds = 0
+        self._lock = threading.Lock()
+
+    def add(self, latitude, longitude, result):
+        with self._lock:
+            bucket = self._buckets.setdefault(self._bucket(latitude, longitude), {})
+            bucket[(latitude, longitude)] = (result, time.time())
+            self._adds += 1
+            if self._adds % self.PURGE_EVERY == 0:
+                self._purge()
+
+    def neighbours(self, latitude, longitude):
+        """[(distance_km, résultat)] frais dans le rayon, du plus proche au plus lointain"""
+        span_lat = self.radius_km / 111.0
+        span_lon = span_lat / max(math.cos(math.radians(latitude)), 0.01)
+        i_min, j_min = self._bucket(latitude - span_lat, longitude - span_lon)
+        i_max, j_max = self._bucket(latitude + span_lat, longitude + span_lon)
+        now = time.time()
+
+        found = []
+        with self._lock:
+            for i in range(i_min, i_max + 1):
+                for j in range(j_min, j_max + 1):
+                    bucket = self._buckets.get((i, j))
+                    if not bucket:
+                        continue
+                    for (lat, lon), (result, stored_at) in list(bucket.items()):
+                        if now - stored_at > self.max_age:
+                            del bucket[(lat, lon)]
+                            continue
+                        distance = haversine_km(latitude, longitude, lat, lon)
+                        if distance <= self.radius_km:
+                            found.append((distance, result))
+                    if not bucket:
+                        del self._buckets[(i, j)]
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def interpolate(self, latitude, longitude, location_name=None):
+        """Résultat interpolé (marqué "interpolated") ou None si la couverture est insuffisante"""
+        found = self.neighbours(latitude, longitude)
+        if not found:
+            return None
+        nearest_distance, nearest = found[0]
+        if nearest_distance > 0.5 and len(found) < self.min_neighbours:
+            return None
+        if nearest_distance <= 0.5:
+            found = found[:1]  # quasi même point : réutilisation directe
+
+        weights = [1 / max(distance, 0.1) ** self.POWER for distance, _ in found]
+        results = [result for _, result in found]
+
+        currents = [result["current"] for result in results]
+        current = dict(nearest["current"])  # lever/coucher du soleil, direction du vent : plus proche voisin
+        for field in CURRENT_NUMERIC:
+            if all(field in c for c in currents):
+                current[field] = _idw([c[field] for c in currents], weights, field in INTEGER_FIELDS)
+        for field in ("icon", "description", "main"):
+            current[field] = _weighted_mode([c[field] for c in currents], weights)
+
+        return {
+            "location": {
+                "name": location_name or "Votre position",
+                "latitude": latitude,
+                "longitude": longitude
+            },
+            "current": current,
+            "forecast": self._interpolate_forecast(results, weights, nearest),
+            "alerts": nearest["alerts"],
+            "alerts_source": "nearest",
+            "history": nearest.get("history"),
+            "history_source": "nearest",
+            "updated_at": min(result["updated_at"] for result in results),
+            "interpolated": True,
+            "interpolation": {
+                "neighbours": len(found),
+                "radius_km": self.radius_km,
+                "nearest_km": round(nearest_distance, 1),
+            },
+        }
+
+    def _interpolate_forecast(self, results, weights, nearest):
+        forecast = []
+        for day in nearest["forecast"]:
+            same_day = [
+                (next((d for d in result["forecast"] if d["date"] == day["date"]), None), weight)
+                for result, weight in zip(results, weights)
+            ]
+            same_day = [(d, weight) for d, weight in same_day if d is not None]
+            days, day_weights = [d for d, _ in same_day], [weight for _, weight in same_day]
+
+            merged = dict(day)
+            for field in FORECAST_NUMERIC:
+                merged[field] = _idw([d[field] for d in days], day_weights, field in INTEGER_FIELDS)
+            merged["icon"] = _weighted_mode([d["icon"] for d in days], day_weights)
+            merged["description"] = _weighted_mode([d["description"] for d in days], day_weights)
+            forecast.append(merged)
+        return forecast
+
+    def _purge(self):
+        """Supprime les résultats périmés de tous les seaux (mémoire bornée)"""
+        cutoff = time.time() - self.max_age
+        for key, bucket in list(self._buckets.items()):
+            for point, (_, stored_at) in list(bucket.items()):
+                if stored_at < cutoff:
+                    del bucket[point]
+            if not bucket:
+                del self._buckets[key]
+
+    def _bucket(self, latitude, longitude):
+        return math.floor(latitude / self.BUCKET_DEGREES), math.floor(longitude / self.BUCKET_DEGREES)
+
+
+SPATIAL_INDEX = SpatialWeatherIndex()
@@ -0,0 +1,219 @@
+# weather/subscriptions.py
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+
+from chat.sse import format_comment, format_event
+
+logger = logging.getLogger(__name__)
+
+
+def diff_alerts(previous, current):
+    """
+    Différence entre deux listes d'alertes, par id.
+    Une alerte est « modifiée » si sa sévérité change : les reformulations de
+    Gemini à chaque rafraîchissement ne sont pas poussées.
+    """
+    before = {alert["id"]: alert for alert in previous}
+    after = {alert["id"]: alert for alert in current}
+    return {
+        "added": [alert for alert_id, alert in after.items() if alert_id not in before],
+        "removed": [alert_id for alert_id in before if alert_id not in after],
+        "changed": [
+            alert for alert_id, alert in after.items()
+            if alert_id in before and alert["severity"] != before[alert_id]["severity"]
+        ],
+    }
+
+
+class CellChannel:
+    """
+    Canal d'une cellule de grille : un seul rafraîchissement et un seul calcul
+    de diff, sérialisé une fois ; les abonnés ne font que relire la trame.
+    """
+
+    def __init__(self, cell):
+        self.cell = cell
+        lat, lon = cell.split(":")
+        self.latitude = float(lat)
+        self.longitude = float(lon)
+        self.version = 0
+        self.alerts = None       # None tant qu'aucun rafraîchissement n'a réussi
+        self.error = None
+        self.frame = None        # dernière trame de diff, partagée par tous les abonnés
+        self.snapshot = self._snapshot_frame()
+        self.refreshed_at = 0.0
+        self.listeners = set()   # threading.Event des abonnés
+        self.idle_since = None
+
+    def _snapshot_frame(self):
+        if self.alerts is None:
+            # Pas encore d'alertes connues : ne pas laisser croire qu'il n'y en a aucune
+            return format_event(
+                {"cell": self.cell, "version": 0, "status": "error" if self.error else "pending", "error": self.error},
+                event_id=f"{self.cell}@0", event="status",
+            )
+        return format_event(
+            {"cell": self.cell, "version": self.version, "alerts": self.alerts},
+            event_id=f"{self.cell}@{self.version}", event="snapshot",
+        )
+
+    def fail(self, message):
+        """Échec de rafraîchissement : signalé seulement si aucune alerte n'est encore connue"""
+        if self.alerts is not None or self.error == message:
+            return
+        self.error = message
+        self.snapshot = self._snapshot_frame()
+        self._notify()
+
+    def publish(self, alerts):
+        """Met à jour les alertes ; renvoie True si un diff a été poussé"""
+        if self.alerts is None:
+            self.alerts = alerts
+            self.error = None
+            self.version = 1
+            self.snapshot = self._snapshot_frame()
+            self._notify()
+            return True
+        diff = diff_alerts(self.alerts, alerts)
+        self.alerts = alerts
+        if not any(diff.values()):
+            return False
+        self.version += 1
+        self.frame = format_event(
+            {"cell": self.cell, "version": self.version, **diff},
+            event_id=f"{self.cell}@{self.version}", event="alerts",
+        )
+        self.snapshot = self._snapshot_frame()
+        self._notify()
+        return True
+
+    def _notify(self):
+        for listener in list(self.listeners):
+            listener.set()
+
+
+class SubscriptionHub:
+    """
+    Abonnements SSE aux alertes par cellule de grille.
+
+    Un thread unique planifie, toutes les REFRESH_INTERVAL secondes, le
+    rafraîchissement de chaque cellule ayant au moins un abonné (via le cache
+    météo partagé) : la charge dépend du nombre de cellules, pas du nombre de
+    téléphones abonnés. Les cellules dues sont rafraîchies en parallèle
+    (`workers` threads) pour que leurs alertes partagent les lots Gemini.
+
+    Tant qu'aucune alerte n'a pu être obtenue pour une cellule, les abonnés
+    reçoivent un événement "status" (pending / error), jamais une liste vide.
+    Le premier rafraîchissement d'une cellule ne retarde pas l'envoi de cet état.
+    """
+
+    REFRESH_INTERVAL = 300  # secondes
+    IDLE_GRACE = 600        # conservation d'un canal sans abonné
+    HEARTBEAT_INTERVAL = 15
+    MAX_CELLS_PER_SUBSCRIPTION = 10
+
+    def __init__(self, fetch_alerts, workers=10):
+        self.fetch_alerts = fetch_alerts  # (latitude, longitude) -> liste d'alertes
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="weather-refresh")
+
+    def subscribe(self, cells, listener):
+        with self._lock:
+            channels = []
+            for cell in cells:
+                channel = self._channels.get(cell)
+                if channel is None:
+                    channel = self._channels[cell] = CellChannel(cell)
+                channel.listeners.add(listener)
+                channel.idle_since = None
+                channels.append(channel)
+            pending = [channel for channel in channels if not channel.refreshed_at]
+            for channel in pending:
+                channel.refreshed_at = time.monotonic()
+            self._ensure_thread()
+        # Premier abonné : rafraîchissement immédiat en arrière-plan, sans attendre
+        # le prochain cycle ; l'abonné reçoit d'abord l'état "pending"
+        for channel in pending:
+            self._pool.submit(self._refresh, channel)
+        return channels
+
+    def unsubscribe(self, channels, listener):
+        with self._lock:
+            for channel in channels:
+                channel.listeners.discard(listener)
+                if not channel.listeners:
+                    channel.idle_since = time.monotonic()
+
+    def stream(self, cells):
+        """Générateur SSE : instantané de chaque cellule, puis uniquement les diffs"""
+        listener = threading.Event()
+        channels = self.subscribe(cells, listener)
+        seen = {}
+        try:
+            yield "retry: 10000\n\n"
+            for channel in channels:
+                with self._lock:
+                    seen[channel.cell] = channel.version, channel.snapshot
+                yield seen[channel.cell][1]
+            while True:
+                if not listener.wait(self.HEARTBEAT_INTERVAL):
+                    yield format_comment()
+                    continue
+                listener.clear()
+                for channel in channels:
+                    with self._lock:
+                        version, frame, snapshot = channel.version, channel.frame, channel.snapshot
+                    seen_version, seen_snapshot = seen[channel.cell]
+                    if snapshot == seen_snapshot:
+                        continue
+                    # Diff unique manqué : on le rejoue, sinon nouvel instantané (ou statut)
+                    yield frame if version == seen_version + 1 and frame else snapshot
+                    seen[channel.cell] = version, snapshot
+        finally:
+            self.unsubscribe(channels, listener)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="weather-subscriptions", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(min(self.REFRESH_INTERVAL, 30))
+            now = time.monotonic()
+            with self._lock:
+                for cell, channel in list(self._channels.items()):
+                    if channel.idle_since is not None and now - channel.idle_since > self.IDLE_GRACE:
+                        del self._channels[cell]
+                due = [
+                    channel for channel in self._channels.values()
+                    if channel.listeners and now - channel.refreshed_at >= self.REFRESH_INTERVAL
+                ]
+            self._refresh_all(due)
+
+    def _refresh_all(self, channels):
+        """Rafraîchit les canaux en parallèle et attend la fin de tous"""
+        for _ in self._pool.map(self._refresh, channels):
+            pass
+
+    def _refresh(self, channel):
+        channel.refreshed_at = time.monotonic()
+        try:
+            alerts = self.fetch_alerts(channel.latitude, channel.longitude)
+        except Exception as e:
+            logger.error(f"Rafraîchissement des alertes impossible pour {channel.cell} : {e}")
+            with self._lock:
+                channel.fail("Alertes météo momentanément indisponibles pour cette zone.")
+            return
+        finally:
+            connection.close()  # connexion ouverte par ce thread du pool (historique)
+        with self._lock:
+            if channel.publish(alerts):
+                logger.info(f"Alertes {channel.cell} v{channel.version} poussées à {len(channel.listeners)} abonné(s)")
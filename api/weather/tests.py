@@ -1,3 +1,517 @@
-from django.test import TestCase
+import os
+import json
+import tempfile
+import time
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from .batching import MicroBatcher
+from .bundles import RegionBundleBuilder
+from .history import WeatherHistory, grid_cell
+from .models import ForecastSlot, ObservationDaily, WeatherDaily, WeatherObservation
+from .services import WeatherService
+from .slots import ForecastSlotCache
+from .spatial import SpatialWeatherIndex, haversine_km
+from .subscriptions import SubscriptionHub, diff_alerts
+
+
+def parse_event(frame):
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return fields.get("event"), json.loads(fields["data"])
+
+
+class DiffAlertsTests(SimpleTestCase):
+
+    def test_added_removed_changed(self):
+        before = [{"id": "a", "severity": "low", "message": "x"}, {"id": "b", "severity": "high", "message": "y"}]
+        after = [{"id": "b", "severity": "medium", "message": "y"}, {"id": "c", "severity": "low", "message": "z"}]
+        diff = diff_alerts(before, after)
+        self.assertEqual([alert["id"] for alert in diff["added"]], ["c"])
+        self.assertEqual(diff["removed"], ["a"])
+        self.assertEqual([alert["id"] for alert in diff["changed"]], ["b"])
+
+    def test_rewording_is_not_a_change(self):
+        before = [{"id": "a", "severity": "low", "message": "Pluie attendue"}]
+        after = [{"id": "a", "severity": "low", "message": "Des pluies sont attendues"}]
+        self.assertFalse(any(diff_alerts(before, after).values()))
+
+
+class SubscriptionHubTests(SimpleTestCase):
+
+    def test_pending_status_sent_before_first_fetch_completes(self):
+        release = threading.Event()
+
+        def fetch(latitude, longitude):
+            release.wait(5)
+            return [{"id": "a", "severity": "low"}]
+
+        stream = SubscriptionHub(fetch).stream(["5.4:-4.0"])
+        started = time.monotonic()
+        next(stream)  # retry
+        event, data = parse_event(next(stream))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual((event, data["status"]), ("status", "pending"))
+
+        release.set()
+        event, data = parse_event(next(stream))
+        stream.close()
+        self.assertEqual(event, "snapshot")
+        self.assertEqual((data["version"], [alert["id"] for alert in data["alerts"]]), (1, ["a"]))
+
+    def test_failed_first_fetch_is_not_an_empty_snapshot(self):
+        release = threading.Event()
+
+        def fetch(latitude, longitude):
+            release.wait(5)
+            raise RuntimeError("OpenWeather indisponible")
+
+        stream = SubscriptionHub(fetch).stream(["5.4:-4.0"])
+        next(stream)  # retry
+        self.assertEqual(parse_event(next(stream))[1]["status"], "pending")
+        release.set()
+        event, data = parse_event(next(stream))
+        stream.close()
+        self.assertEqual(event, "status")
+        self.assertEqual(data["status"], "error")
+        self.assertNotIn("alerts", data)
+
+    def test_cells_are_refreshed_concurrently(self):
+        def fetch(latitude, longitude):
+            time.sleep(0.2)
+            return []
+
+        hub = SubscriptionHub(fetch, workers=10)
+        started = time.monotonic()
+        channels = hub.subscribe([f"5.{i}:-4.0" for i in range(8)], threading.Event())
+        self.assertLess(time.monotonic() - started, 0.1)
+        while any(channel.version != 1 for channel in channels) and time.monotonic() - started < 2:
+            time.sleep(0.01)
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertTrue(all(channel.version == 1 for channel in channels))
+
+
+class SubscribeViewTests(SimpleTestCase):
+
+    def test_invalid_coordinates_rejected(self):
+        for query in (
+            "latitude=nan&longitude=nan", "latitude=95&longitude=-4", "latitude=5&longitude=inf",
+            "cells=5.4:-4.0,nan:1", "latitude=abc&longitude=1", "cells=,",
+        ):
+            with mock.patch("weather.views.ALERT_SUBSCRIPTIONS") as hub:
+                hub.MAX_CELLS_PER_SUBSCRIPTION = 10
+                response = self.client.get(f"/api/weather/subscribe/?{query}")
+            self.assertEqual(response.status_code, 400, query)
+            hub.stream.assert_not_called()
+
+class ForecastSlotCacheTests(SimpleTestCase):
+
+    def row(self, valid_at, issued_at):
+        return {
+            "valid_at": valid_at, "issued_at": issued_at, "temperature": 28.0, "humidity": 80, "pop": 0.4,
+            "rain_mm": 1.2, "wind_speed": 10.0, "clouds": 60, "icon": "10d", "description": "pluie légère",
+        }
+
+    def test_empty_merge_is_not_cached(self):
+        cache = ForecastSlotCache()
+        cache.merge_rows("5.4:-4.0", [])
+        self.assertIsNone(cache.get("5.4:-4.0"))
+
+    def test_rows_keep_their_issue_time(self):
+        cache = ForecastSlotCache()
+        now = datetime.now(tz=dt_timezone.utc)
+        issued_at = now - timedelta(hours=2)
+        cache.merge_rows("5.4:-4.0", [self.row(now, issued_at), self.row(now + timedelta(hours=3), issued_at)])
+        series = cache.get("5.4:-4.0")
+        self.assertAlmostEqual(series.updated_at, issued_at.timestamp(), places=3)
+        self.assertEqual(len(cache.window("5.4:-4.0", now.timestamp() - 1, now.timestamp() + 4 * 3600)), 2)
+
+
+class MicroBatcherTests(SimpleTestCase):
+
+    def submit_all(self, batcher, items):
+        results, errors = {}, {}
+
+        def call(item):
+            try:
+                results[item] = batcher.submit(item)
+            except Exception as e:
+                errors[item] = e
+
+        threads = [threading.Thread(target=call, args=(item,)) for item in items]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_concurrent_submits_share_one_call(self):
+        calls = []
+
+        def process(items):
+            calls.append(list(items))
+            return [item * 10 for item in items]
+
+        results, errors = self.submit_all(MicroBatcher(process, window=0.2, max_size=10), range(5))
+        self.assertEqual(errors, {})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(calls[0]), [0, 1, 2, 3, 4])
+        self.assertEqual(results, {item: item * 10 for item in range(5)})
+
+    def test_full_batch_runs_without_waiting_window(self):
+        calls = []
+
+        def process(items):
+            calls.append(len(items))
+            return list(items)
+
+        started = time.monotonic()
+        results, _ = self.submit_all(MicroBatcher(process, window=5, max_size=3), range(6))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(sorted(calls), [3, 3])
+        self.assertEqual(results, {item: item for item in range(6)})
+
+    def test_short_result_list_gives_none(self):
+        batcher = MicroBatcher(lambda items: [], window=0)
+        self.assertIsNone(batcher.submit("a"))
+
+    def test_error_reaches_every_caller(self):
+        def process(items):
+            raise ValueError("boom")
+
+        results, errors = self.submit_all(MicroBatcher(process, window=0.2), range(3))
+        self.assertEqual(results, {})
+        self.assertEqual(set(errors), {0, 1, 2})
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors.values()))
+
+
+ALERT = {
+    "id": "black_pod",
+    "severity": "high",
+    "title": "Risque de pourriture brune",
+    "message": "Humidité élevée et chaleur : surveille tes cabosses.",
+    "recommendations": ["Récolte les cabosses malades"],
+}
+
+CURRENT = {"temperature": 28, "feels_like": 31, "humidity": 85, "wind_speed": 6, "rain_1h": 0}
+FORECAST = [{
+    "date": "2026-10-20", "temp_max": 31, "temp_min": 23, "humidity": 88,
+    "rain_probability": 70, "wind_speed": 8, "rain_mm": 12,
+}]
+
+
+class FakeUsage:
+    prompt_token_count = 100
+    candidates_token_count = 50
+
+
+class FakeModel:
+    def __init__(self, text):
+        self.text = text
+        self.prompts = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.prompts.append(prompt)
+        return type("Response", (), {"text": self.text, "usage_metadata": FakeUsage()})()
+
+
+class GenerateAlertsBatchTests(SimpleTestCase):
+
+    def items(self, count):
+        return [(f"Ferme {index}", CURRENT, FORECAST) for index in range(count)]
+
+    def test_results_aligned_on_items(self):
+        model = FakeModel(json.dumps({"locations": [
+            {"id": "loc_1", "alerts": [ALERT]},
+            {"id": "loc_0", "alerts": []},
+        ]}))
+        results = WeatherService._generate_alerts_batch(self.items(3), model=model)
+        self.assertEqual(results, [[], [ALERT], None])
+        self.assertEqual(len(model.prompts), 1)
+        for index in range(3):
+            self.assertIn(f"[loc_{index}] Ferme {index}", model.prompts[0])
+
+    def test_invalid_location_falls_back_alone(self):
+        model = FakeModel(json.dumps({"locations": [
+            {"id": "loc_0", "alerts": [{**ALERT, "severity": "extreme"}]},
+            {"id": "loc_1", "alerts": [ALERT]},
+        ]}))
+        results = WeatherService._generate_alerts_batch(self.items(2), model=model)
+        self.assertEqual(results, [None, [ALERT]])
+
+    def test_history_is_labelled_as_forecast(self):
+        model = FakeModel(json.dumps({"locations": []}))
+        history = {"forecast_rain_14d_mm": 42, "forecast_humid_hours_7d": 30}
+        WeatherService._generate_alerts_batch([("Ferme", CURRENT, FORECAST, history)], model=model)
+        self.assertIn("prévisions passées (pas des mesures)", model.prompts[0])
+
+    def test_non_json_response_raises(self):
+        with self.assertRaises(ValueError):
+            WeatherService._generate_alerts_batch(self.items(1), model=FakeModel("Voici tes alertes !"))
+
+
+NOW = datetime(2026, 10, 19, 12, tzinfo=dt_timezone.utc)
+CELL = grid_cell(6.8, -5.3)
+
+
+def add_slots(start, count, rain_mm=1.0, humidity=90, cell=CELL):
+    ForecastSlot.objects.bulk_create([
+        ForecastSlot(
+            cell=cell, valid_at=start + timedelta(hours=3 * index), issued_at=start,
+            temperature=27, temp_min=23 + index % 8, temp_max=30, humidity=humidity, pop=0.5,
+            rain_mm=rain_mm, wind_speed=8, clouds=60, icon="10d", description="pluie légère",
+        )
+        for index in range(count)
+    ])
+
+
+def add_observations(start, count, temperature=25.0, cell=CELL):
+    WeatherObservation.objects.bulk_create([
+        WeatherObservation(
+            cell=cell, observed_at=start + timedelta(hours=index), temperature=temperature + index,
+            humidity=80, pressure=1010, wind_speed=5 + index, clouds=40, rain_1h=0.2 * index, icon="04d",
+        )
+        for index in range(count)
+    ])
+
+
+class WeatherHistoryTests(TestCase):
+
+    def test_summary_requires_half_coverage(self):
+        add_slots(NOW - timedelta(days=14), 55)
+        self.assertIsNone(WeatherHistory.summary(6.8, -5.3, now=NOW))
+        add_slots(NOW - timedelta(days=7), 1)
+        summary = WeatherHistory.summary(6.8, -5.3, now=NOW)
+        self.assertEqual(summary["source"], "forecast")
+        self.assertEqual(summary["forecast_rain_14d_mm"], 56.0)
+        self.assertEqual(summary["coverage"], 0.5)
+        self.assertEqual(summary["forecast_humid_hours_7d"], 3)
+
+    def test_rain_between_mixes_raw_and_daily(self):
+        WeatherDaily.objects.create(
+            cell=CELL, date=(NOW - timedelta(days=40)).date(), temp_min=22, temp_max=31, temp_avg=27,
+            humidity_avg=88, humid_hours=12, rain_mm=20, slots=8,
+        )
+        add_slots(NOW - timedelta(days=2), 8, rain_mm=0.5)
+        add_slots(NOW - timedelta(days=60), 8, rain_mm=100)  # hors intervalle
+        rain = WeatherHistory.rain_between(CELL, NOW - timedelta(days=45), NOW)
+        self.assertEqual(rain, {"rain_mm": 24.0, "slots": 16})
+        self.assertEqual(WeatherHistory.humid_hours_between(CELL, NOW - timedelta(days=45), NOW), 12 + 24)
+
+    def test_downsample_aggregates_then_deletes(self):
+        day = datetime(2026, 9, 1, tzinfo=dt_timezone.utc)
+        add_slots(day, 8, rain_mm=2)
+        add_slots(NOW - timedelta(days=1), 8)  # récent : conservé brut
+        add_observations(day, 4)
+
+        self.assertEqual(WeatherHistory.downsample(now=NOW), 1)
+        daily = WeatherDaily.objects.get()
+        self.assertEqual((daily.date, daily.slots, daily.rain_mm, daily.humid_hours), (day.date(), 8, 16.0, 24))
+        self.assertEqual((daily.temp_min, daily.temp_max), (23, 30))
+        self.assertEqual(ForecastSlot.objects.count(), 8)
+
+        observed = ObservationDaily.objects.get()
+        self.assertEqual((observed.date, observed.observations), (day.date(), 4))
+        self.assertEqual((observed.temp_min, observed.temp_max, observed.wind_max), (25, 28, 8))
+        self.assertFalse(WeatherObservation.objects.exists())
+
+    def test_downsample_upserts_and_applies_retention(self):
+        day = datetime(2026, 9, 1, tzinfo=dt_timezone.utc)
+        add_slots(day, 4, rain_mm=1)
+        WeatherHistory.downsample(now=NOW)
+        WeatherDaily.objects.create(
+            cell=CELL, date=(NOW - timedelta(days=800)).date(), temp_min=22, temp_max=31, temp_avg=27,
+            humidity_avg=88, rain_mm=1, slots=8,
+        )
+        add_slots(day + timedelta(hours=12), 4, rain_mm=3)  # créneaux arrivés après coup
+        WeatherHistory.downsample(now=NOW)
+        daily = WeatherDaily.objects.get()
+        self.assertEqual((daily.slots, daily.rain_mm), (4, 12.0))
+
+    def test_observations_daily_combines_aggregates_and_raw(self):
+        old = datetime(2026, 9, 1, tzinfo=dt_timezone.utc)
+        add_observations(old, 3)
+        WeatherHistory.downsample(now=NOW)
+        add_observations(NOW - timedelta(days=1), 2, temperature=30)
+        days = WeatherHistory.observations_daily(CELL, NOW - timedelta(days=60), NOW)
+        self.assertEqual([day["date"] for day in days], [old.date(), (NOW - timedelta(days=1)).date()])
+        self.assertEqual([day["observations"] for day in days], [3, 2])
+        self.assertEqual(days[1]["temp_max"], 31)
+
+
+def weather_result(temperature, humidity=80, icon="10d", alerts=()):
+    return {
+        "location": {"name": "Ferme"},
+        "current": {
+            "temperature": temperature, "feels_like": temperature + 2, "humidity": humidity, "wind_speed": 6,
+            "rain_1h": 0, "icon": icon, "description": "pluie", "main": "Rain", "sunrise": "06:10",
+        },
+        "forecast": [{
+            "date": "2026-10-20", "temp": temperature, "temp_min": temperature - 4, "temp_max": temperature + 3,
+            "humidity": humidity, "rain_probability": 60, "rain_mm": 4, "wind_speed": 8, "clouds": 70,
+            "icon": icon, "description": "pluie",
+        }],
+        "alerts": list(alerts),
+        "history": {"forecast_rain_14d_mm": 30},
+        "updated_at": "2026-10-19T12:00:00",
+    }
+
+
+@override_settings(WEATHER_INTERPOLATION={"radius_km": 15, "min_neighbours": 3, "max_age": 1800})
+class SpatialWeatherIndexTests(SimpleTestCase):
+
+    POINT = (5.0, -4.0)
+
+    def index_with(self, offsets):
+        index = SpatialWeatherIndex()
+        for (dlat, dlon), result in offsets:
+            index.add(self.POINT[0] + dlat, self.POINT[1] + dlon, result)
+        return index
+
+    def test_idw_values(self):
+        neighbours = [((0.05, 0), weather_result(24, icon="01d")), ((0, 0.08), weather_result(28)),
+                      ((-0.1, 0), weather_result(30))]
+        index = self.index_with(neighbours)
+        result = index.interpolate(*self.POINT, "Ferme")
+
+        weights = [1 / haversine_km(*self.POINT, self.POINT[0] + dlat, self.POINT[1] + dlon) ** 2
+                   for (dlat, dlon), _ in neighbours]
+        expected = sum(w * r["current"]["temperature"] for w, (_, r) in zip(weights, neighbours)) / sum(weights)
+        self.assertEqual(result["current"]["temperature"], round(expected, 1))
+        self.assertEqual(result["current"]["humidity"], 80)
+        self.assertEqual(result["current"]["icon"], "01d")  # plus proche : poids dominant
+        self.assertEqual(result["forecast"][0]["temp_max"], round(expected + 3, 1))
+        self.assertTrue(result["interpolated"])
+        self.assertEqual(result["interpolation"]["neighbours"], 3)
+        self.assertEqual((result["alerts_source"], result["history_source"]), ("nearest", "nearest"))
+
+    def test_too_few_neighbours_in_radius(self):
+        index = self.index_with([
+            ((0.05, 0), weather_result(24)), ((0, 0.08), weather_result(28)),
+            ((0.5, 0), weather_result(30)),  # ~55 km : hors rayon
+        ])
+        self.assertIsNone(index.interpolate(*self.POINT))
+
+    def test_single_neighbour_reused_within_half_km(self):
+        index = self.index_with([((0.003, 0), weather_result(26, alerts=[{"id": "black_pod"}]))])
+        result = index.interpolate(*self.POINT)
+        self.assertEqual(result["current"]["temperature"], 26)
+        self.assertEqual(result["alerts"], [{"id": "black_pod"}])
+        self.assertEqual(result["interpolation"]["neighbours"], 1)
+
+    def test_stale_results_expire(self):
+        index = SpatialWeatherIndex()
+        with mock.patch("weather.spatial.time.time", return_value=1000):
+            index.add(self.POINT[0] + 0.003, self.POINT[1], weather_result(26))
+        with mock.patch("weather.spatial.time.time", return_value=1000 + index.max_age + 1):
+            self.assertIsNone(index.interpolate(*self.POINT))
+
+
+class InterpolationBypassTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        index = SpatialWeatherIndex()
+        index.add(5.0, -4.003, weather_result(26))
+        patches = [
+            mock.patch("weather.services.SPATIAL_INDEX", index),
+            mock.patch.object(WeatherService, "_get_forecast", return_value=weather_result(31)["forecast"]),
+            mock.patch.object(WeatherService, "_get_current_weather", return_value=weather_result(31)["current"]),
+            mock.patch.object(WeatherService, "_get_history_summary", return_value=None),
+            mock.patch.object(WeatherService, "_generate_agricultural_alerts_with_gemini", return_value=[]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(cache.clear)
+
+    def test_interpolated_by_default(self):
+        result = WeatherService.get_weather_for_location(5.0, -4.0)
+        self.assertTrue(result["interpolated"])
+        WeatherService._get_forecast.assert_not_called()
+
+    def test_bypass_fetches_and_ignores_cached_interpolation(self):
+        WeatherService.get_weather_for_location(5.0, -4.0)
+        result = WeatherService.get_weather_for_location(5.0, -4.0, allow_interpolation=False)
+        self.assertFalse(result["interpolated"])
+        self.assertEqual(result["current"]["temperature"], 31)
+        self.assertEqual(result["alerts_source"], "location")
+        WeatherService._get_forecast.assert_called_once()
+
+
+class RegionBundleBuilderTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patch = override_settings(WEATHER_BUNDLES_ROOT=self.root.name, WEATHER_BUNDLES_URL="/bundles/")
+        patch.enable()
+        self.addCleanup(patch.disable)
+
+    def build(self, temperature=27):
+        points = RegionBundleBuilder._region_points("abidjan")
+        weather = {cell: weather_result(temperature) for cell in points}
+        return RegionBundleBuilder.build_region("abidjan", Path(self.root.name), points, weather)
+
+    def test_same_content_same_file(self):
+        first = self.build()
+        data = (Path(self.root.name) / first["url"].rsplit("/", 1)[1]).read_bytes()
+        second = self.build()
+        self.assertEqual(first["url"], second["url"])
+        self.assertEqual(first["sha256"], second["sha256"])
+        self.assertEqual((Path(self.root.name) / second["url"].rsplit("/", 1)[1]).read_bytes(), data)
+        self.assertEqual(first["cells"], 3)
+        self.assertNotEqual(self.build(temperature=30)["url"], first["url"])
+
+    def test_prune_keeps_latest_versions(self):
+        root = Path(self.root.name)
+        for index in range(4):
+            path = root / f"abidjan.{index:016x}.json.gz"
+            path.write_bytes(b"")
+            os.utime(path, (1000 + index, 1000 + index))
+        (root / "bafing.0000000000000000.json.gz").write_bytes(b"")
+        RegionBundleBuilder._prune(root, "abidjan")
+        self.assertEqual(sorted(path.name for path in root.glob("*.json.gz")), [
+            "abidjan.0000000000000002.json.gz", "abidjan.0000000000000003.json.gz", "bafing.0000000000000000.json.gz",
+        ])
+
+    def test_manifest_keeps_previous_entry_without_cells(self):
+        points = RegionBundleBuilder._region_points("abidjan")
+        weather = {cell: weather_result(27) for cell in points}
+        with mock.patch.object(RegionBundleBuilder, "_fetch_all", return_value=weather):
+            previous = RegionBundleBuilder.build_all(["abidjan"])["regions"]["abidjan"]
+        with mock.patch.object(RegionBundleBuilder, "_fetch_all", return_value={}):
+            manifest = RegionBundleBuilder.build_all(["abidjan"])
+        self.assertEqual(manifest["regions"]["abidjan"], previous)
+        saved = json.loads((Path(self.root.name) / "manifest.json").read_text())
+        self.assertEqual(saved["regions"]["abidjan"]["sha256"], previous["sha256"])
+
+    def test_active_cells_routed_to_nearest_region_inside_country(self):
+        now = datetime.now(dt_timezone.utc)
+        for cell in ("5.4:-4.0", "9.5:-5.6", "48.9:2.3", "5.6:-0.2"):  # Paris et Accra : hors du pays
+            add_slots(now, 1, cell=cell)
+        add_slots(now - timedelta(days=3), 1, cell="7.7:-5.0")  # trop ancienne
+        self.assertEqual(RegionBundleBuilder._active_cells(), {"abidjan": ["5.4:-4.0"], "poro": ["9.5:-5.6"]})
+
+
+class EvictedCellSlotsTests(TestCase):
+
+    def test_evicted_cell_reloads_full_horizon(self):
+        now = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+        add_slots(now - timedelta(hours=6), 24, cell=grid_cell(5.36, -4.01))  # 3 jours de créneaux
+        ForecastSlot.objects.update(issued_at=datetime.now(dt_timezone.utc))  # prévision fraîche
+        slots_cache = ForecastSlotCache()
+        with mock.patch("weather.services.FORECAST_SLOTS", slots_cache), \
+                mock.patch.object(WeatherService, "get_weather_for_location") as daily:
+            start = int(now.timestamp())
+            narrow = WeatherService.get_forecast_slots(5.36, -4.01, start=start, hours=6)
+            wide = WeatherService.get_forecast_slots(5.36, -4.01, start=start, hours=48)
+        self.assertEqual(len(narrow["slots"]), 2)
+        self.assertEqual(len(wide["slots"]), 16)
+        self.assertEqual(len(slots_cache.window(grid_cell(5.36, -4.01), 0, 2 ** 40)), 24)
+        daily.assert_called_once()  # série rechargée une seule fois, puis servie depuis le cache
@@ -2,13 +2,17 @@
 
 from django.urls import path
 from .views import (
+    WeatherAlertsSubscribeView,
     WeatherByCoordinatesView,
     WeatherByCityView,
+    WeatherForecastSlotsView,
     WeatherTestView
 )
 
 urlpatterns = [
     path('coordinates/', WeatherByCoordinatesView.as_view(), name='weather_coordinates'),
+    path('slots/', WeatherForecastSlotsView.as_view(), name='weather_slots'),
+    path('subscribe/', WeatherAlertsSubscribeView.as_view(), name='weather_subscribe'),
     path('city/', WeatherByCityView.as_view(), name='weather_city'),
     path('test/', WeatherTestView.as_view(), name='weather_test'),
 ]
\ No newline at end of file
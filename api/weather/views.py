@@ -1,9 +1,11 @@
 # weather/views.py
 
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .services import WeatherService
+from .history import grid_cell
+from .services import ALERT_STATS, ALERT_SUBSCRIPTIONS, WeatherService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -66,6 +68,101 @@ class WeatherByCoordinatesView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class WeatherForecastSlotsView(APIView):
+    """
+    Prévisions brutes 3 h (timing des pluies dans la journée)
+
+    POST /api/weather/slots/
+    Body: {
+        "latitude": 5.3599517,
+        "longitude": -4.0082563,
+        "hours": 24 (optionnel, max 120),
+        "start": 1760000000 (optionnel, timestamp Unix)
+    }
+    """
+
+    MAX_HOURS = 120
+
+    def post(self, request):
+        latitude = request.data.get("latitude")
+        longitude = request.data.get("longitude")
+
+        if latitude is None or longitude is None:
+            return Response({
+                "error": "Les paramètres 'latitude' et 'longitude' sont requis"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            latitude = float(latitude)
+            longitude = float(longitude)
+            hours = min(float(request.data.get("hours", 24)), self.MAX_HOURS)
+            start = request.data.get("start")
+            start = int(start) if start is not None else None
+
+            if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180) or hours <= 0:
+                return Response({
+                    "error": "Paramètres invalides"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            slots = WeatherService.get_forecast_slots(latitude, longitude, start=start, hours=hours)
+            return Response(slots, status=status.HTTP_200_OK)
+
+        except ValueError as e:
+            logger.error(f"Erreur de validation: {e}")
+            return Response({
+                "error": "Format des paramètres invalide"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            logger.error(f"Erreur récupération prévisions 3 h: {e}")
+            return Response({
+                "error": "Impossible de récupérer les données météo",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class WeatherAlertsSubscribeView(APIView):
+    """
+    Abonnement SSE aux changements d'alertes d'une ou plusieurs cellules de grille
+
+    GET /api/weather/subscribe/?latitude=5.36&longitude=-4.01
+    GET /api/weather/subscribe/?cells=5.4:-4.0,6.8:-5.3
+
+    Événements : "snapshot" (alertes complètes à la connexion), puis "alerts"
+    avec uniquement les alertes ajoutées / supprimées / modifiées. Tant que les
+    alertes d'une cellule ne sont pas disponibles : "status" (pending / error).
+    """
+
+    def get(self, request):
+        try:
+            if request.GET.get("cells"):
+                points = [cell.split(":") for cell in request.GET["cells"].split(",") if cell]
+            else:
+                points = [(request.GET["latitude"], request.GET["longitude"])]
+            points = [(float(latitude), float(longitude)) for latitude, longitude in points]
+        except (KeyError, TypeError, ValueError):
+            return Response({
+                "error": "Paramètres 'latitude' et 'longitude' (ou 'cells') requis"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Mêmes bornes que WeatherByCoordinatesView (NaN et infinis compris : comparaisons fausses)
+        if not points or any(not (-90 <= lat <= 90) or not (-180 <= lon <= 180) for lat, lon in points):
+            return Response({
+                "error": "Coordonnées GPS invalides"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        cells = list(dict.fromkeys(grid_cell(lat, lon) for lat, lon in points))
+        if len(cells) > ALERT_SUBSCRIPTIONS.MAX_CELLS_PER_SUBSCRIPTION:
+            return Response({
+                "error": f"{ALERT_SUBSCRIPTIONS.MAX_CELLS_PER_SUBSCRIPTION} cellules maximum par abonnement"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(ALERT_SUBSCRIPTIONS.stream(cells), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 class WeatherByCityView(APIView):
     """
     Récupère la météo par nom de ville
@@ -121,7 +218,8 @@ class WeatherTestView(APIView):
             return Response({
                 "status": "success",
                 "message": "Configuration météo opérationnelle",
-                "sample_data": weather_data
+                "sample_data": weather_data,
+                "alert_stats": ALERT_STATS.snapshot()
             }, status=status.HTTP_200_OK)
             
         except Exception as e: